@@ -2,8 +2,13 @@
 """
 启动Web服务脚本
 同时启动 FastAPI 后端和 Streamlit 前端
+
+开发模式（默认）：单 worker、--reload 热重载
+生产模式（--prod 或 APP_MODE=production）：多 worker、无热重载、预热后再接收请求、
+崩溃自动重启、退出时等待在途请求完成
 """
 
+import argparse
 import subprocess
 import time
 import sys
@@ -11,6 +16,28 @@ import os
 import signal
 from threading import Thread
 
+# 生产模式下未显式配置时使用的环境变量默认值
+PRODUCTION_ENV_DEFAULTS = {
+    # 多个 worker 需共享会话
+    "SESSION_BACKEND": "sqlite",
+    # 每个 worker 等待MCP工具加载完成后再接收请求
+    "AGENT_WARMUP_TIMEOUT": "30",
+    # 每个 worker 写独立的日志文件，避免多进程同时轮转同一文件
+    "LOG_FILE": "route_agent.{pid}.log",
+    # 每个 worker 写独立的追踪文件，避免多进程追加的行相互交错
+    "TRACE_FILE": "traces.{pid}.jsonl",
+}
+
+# 生产模式下按 worker 分文件写入的配置项；显式配置的路径缺少 {pid} 时自动加上
+PER_WORKER_FILES = ("LOG_FILE", "TRACE_FILE", "TRAFFIC_RECORD_FILE")
+
+def per_worker_path(path: str) -> str:
+    """在扩展名前插入 {pid} 占位符，如 traffic.jsonl -> traffic.{pid}.jsonl"""
+    if not path or "{pid}" in path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{{pid}}{ext}"
+
 def start_fastapi():
     """启动 FastAPI 后端"""
     print("🚀 启动 FastAPI 后端服务...")
@@ -27,6 +54,94 @@ def start_fastapi():
     except Exception as e:
         print(f"❌ FastAPI 启动失败: {e}")
 
+def build_production_command(host: str, port: int, workers: int, graceful_timeout: int) -> list:
+    """生产模式的 uvicorn 命令
+
+    uvicorn 的多进程管理器会在 worker 异常退出时自动拉起新的 worker；
+    每个 worker 在 startup 事件完成（智能体预热）之后才开始接收连接
+    """
+    return [
+        sys.executable, "-m", "uvicorn",
+        "route_agent_api:app",
+        "--host", host,
+        "--port", str(port),
+        "--workers", str(workers),
+        "--timeout-graceful-shutdown", str(graceful_timeout),
+    ]
+
+def run_production(args):
+    """以多 worker 方式运行 FastAPI 后端，并在 uvicorn 主进程意外退出时重启"""
+    # 先加载 .env，使其中的配置优先于生产模式默认值
+    from dotenv import load_dotenv
+    load_dotenv()
+    for key, value in PRODUCTION_ENV_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    for key in PER_WORKER_FILES:
+        if os.environ.get(key):
+            os.environ[key] = per_worker_path(os.environ[key])
+    command = build_production_command(args.host, args.port, args.workers, args.graceful_timeout)
+    print(f"🏭 生产模式: {args.workers} 个 worker, 监听 {args.host}:{args.port}")
+
+    stopping = False
+    process = None
+
+    def handle_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if process and process.poll() is None:
+            print("\n🛑 正在停止服务，等待在途请求完成...")
+            # uvicorn 收到 SIGTERM 后停止接收新连接，等待在途请求（最多 graceful_timeout 秒）
+            process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    frontend = None
+    if args.frontend:
+        frontend = subprocess.Popen([
+            sys.executable, "-m", "streamlit",
+            "run", "streamlit_app.py",
+            "--server.port", "8501",
+            "--server.address", args.host,
+            "--server.headless", "true",
+        ])
+
+    restarts = 0
+    try:
+        while True:
+            started = time.monotonic()
+            process = subprocess.Popen(command)
+            code = process.wait()
+            if stopping:
+                break
+            # 启动后很快退出通常是配置错误，不再重启
+            if time.monotonic() - started < 10:
+                print(f"❌ FastAPI 启动失败 (退出码 {code})")
+                break
+            restarts += 1
+            print(f"⚠️ FastAPI 主进程意外退出 (退出码 {code})，第{restarts}次重启...")
+            time.sleep(min(2 ** restarts, 30))
+    finally:
+        if frontend and frontend.poll() is None:
+            frontend.terminate()
+            frontend.wait()
+    print("✅ 服务已停止")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="智能路径规划Web服务启动器")
+    parser.add_argument("--prod", action="store_true",
+                        default=os.getenv("APP_MODE", "development") == "production",
+                        help="生产模式（也可设置 APP_MODE=production）")
+    parser.add_argument("--host", default=os.getenv("APP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("APP_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("APP_WORKERS", "0")) or os.cpu_count() or 1,
+                        help="生产模式的 worker 数量，默认每个 CPU 核心一个")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("APP_GRACEFUL_TIMEOUT", "30")),
+                        help="停止时等待在途请求完成的最长时间（秒）")
+    parser.add_argument("--frontend", action="store_true",
+                        help="生产模式下同时启动 Streamlit 前端")
+    return parser.parse_args()
+
 def start_streamlit():
     """启动 Streamlit 前端"""
     print("🎨 启动 Streamlit 前端界面...")
@@ -46,6 +161,7 @@ def start_streamlit():
 
 def main():
     """主启动函数"""
+    args = parse_args()
     print("🗺️ 智能路径规划Web服务启动器")
     print("=" * 50)
     
@@ -53,8 +169,11 @@ def main():
     print("📦 检查依赖...")
     try:
         import fastapi
-        import streamlit
-        import requests
+        import uvicorn
+        # 生产模式只启动后端时不需要前端依赖
+        if not args.prod or args.frontend:
+            import streamlit
+            import requests
         print("✅ 依赖检查通过")
     except ImportError as e:
         print(f"❌ 缺少依赖: {e}")
@@ -65,6 +184,10 @@ def main():
     if not os.getenv("AMAP_API_KEY") or not os.getenv("OPENAI_API_KEY"):
         print("⚠️ 警告: 请确保在 .env 文件中设置了 AMAP_API_KEY 和 OPENAI_API_KEY")
     
+    if args.prod:
+        run_production(args)
+        return
+    
     print("\n🚀 启动服务...")
     print("FastAPI 后端: http://localhost:8000")
     print("Streamlit 前端: http://localhost:8501")
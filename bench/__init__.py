@@ -0,0 +1,4 @@
+"""
+离线基准测试
+本地模拟高德地图 MCP 服务和模拟LLM，不消耗高德配额和 OpenAI token 即可压测 /route
+"""
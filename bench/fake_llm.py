@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+模拟对话模型
+按提示词识别所处步骤，返回与真实模型格式一致的响应；支持配置延迟和故障注入，
+可直接传给 SimpleRouteAgent(llm=...)
+"""
+
+import asyncio
+import json
+import random
+import re
+from typing import List, Optional
+
+from intent_rules import IntentRuleParser
+
+_USER_INPUT = re.compile(r"用户输入：(.*)")
+_CITY_LOCATIONS = re.compile(r'从中提取出的地点是："(.*?)" 到 "(.*?)"')
+_FORMAT_LOCATIONS = re.compile(r'用户(?:想要|要)从"(.*?)"到"(.*?)"')
+_CORRECTION = re.compile(r'用户指出了错误："(.*?)"')
+
+
+class FakeMessage:
+    """与 langchain AIMessage 一致的最小接口"""
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """模拟对话模型，所有地点都视为深圳市内"""
+
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 100, failure_rate: float = 0.0,
+                 city: str = "深圳", seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.city = city
+        self.random = random.Random(seed)
+        self.calls = 0
+        self._parser = IntentRuleParser()
+
+    async def ainvoke(self, messages: List, **kwargs) -> FakeMessage:
+        self.calls += 1
+        delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if self.random.random() < self.failure_rate:
+            raise RuntimeError("模拟LLM故障")
+        return FakeMessage(self.respond("\n".join(message.content for message in messages)))
+
+    def _locations(self, user_input: str) -> Optional[List[str]]:
+        parsed = self._parser.parse(user_input)
+        return parsed["locations"] if parsed else None
+
+    def _address(self, location: str) -> str:
+        return location if location.startswith(self.city) else f"{self.city}市{location}"
+
+    def respond(self, prompt: str) -> str:
+        """根据提示词生成响应"""
+        if "一次性分析用户输入" in prompt:
+            match = _USER_INPUT.search(prompt)
+            locations = self._locations(match.group(1)) if match else None
+            if not locations:
+                return json.dumps({"intent_type": "other", "reason": "不是路径规划请求"}, ensure_ascii=False)
+            return json.dumps({
+                "intent_type": "route_request",
+                "locations": locations,
+                "addresses": [self._address(location) for location in locations],
+                "city_confidence": "high",
+                "question": "",
+                "analysis": f"地点位于{self.city}",
+            }, ensure_ascii=False)
+
+        if "意图识别专家" in prompt:
+            match = _USER_INPUT.search(prompt)
+            locations = self._locations(match.group(1)) if match else None
+            if not locations:
+                return json.dumps({"intent_type": "other", "reason": "不是路径规划请求"}, ensure_ascii=False)
+            return json.dumps({"intent_type": "route_request", "locations": locations}, ensure_ascii=False)
+
+        match = _CITY_LOCATIONS.search(prompt)
+        if match:
+            return json.dumps({
+                "need_user_input": False,
+                "suggested_city_info": self.city,
+                "analysis": f"地点位于{self.city}",
+            }, ensure_ascii=False)
+
+        match = _FORMAT_LOCATIONS.search(prompt)
+        if match:
+            return ",".join(self._address(location) for location in match.groups())
+
+        match = _CORRECTION.search(prompt)
+        if match:
+            return self._address(match.group(1))
+
+        return "{}"
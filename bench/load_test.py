@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+/route 压测驱动
+在不同并发度下发送路径规划请求，统计 p50/p95/p99 延迟和每秒请求数
+
+默认在进程内启动服务（模拟 MCP 服务 + 模拟LLM），也可用 --url 压测已运行的服务：
+    python -m bench.load_test --concurrency 1,8,32 --requests 200
+    python -m bench.load_test --url http://127.0.0.1:8000 --concurrency 16
+可用 --max-p95-ms / --max-error-rate 设置阈值，超出时以非零状态退出，供 CI 检测性能回退
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+
+# 不包含"到/去/至/从"的深圳地点，组合成 "从A到B怎么走" 供规则意图解析直接命中
+PLACES = [
+    "莲花山公园", "华强北", "深圳北站", "壹方城", "世界之窗", "欢乐谷", "深圳湾公园", "福田口岸",
+    "罗湖火车站", "海上世界", "科技园", "大梅沙", "东门老街", "南山书城", "深圳大学", "蛇口港",
+    "宝安机场", "车公庙", "市民中心", "会展中心", "购物公园", "华侨城", "西丽湖", "莲塘口岸",
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_inputs(count: int, unique: bool, seed: int) -> List[str]:
+    """生成请求文本；unique 时每个地点都不重复，绕过各级缓存"""
+    rng = random.Random(seed)
+    inputs = []
+    for i in range(count):
+        start, end = rng.sample(PLACES, 2)
+        if unique:
+            start, end = f"{start}{i}号门", f"{end}{i}号门"
+        inputs.append(f"从{start}到{end}怎么走")
+    return inputs
+
+
+async def run_level(client: httpx.AsyncClient, inputs: List[str], concurrency: int, timeout: float) -> Dict:
+    """以固定并发发送全部请求"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for text in inputs:
+        queue.put_nowait(text)
+    latencies: List[float] = []
+    errors = 0
+    failures = 0
+
+    async def worker():
+        nonlocal errors, failures
+        while True:
+            try:
+                text = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/route", json={"user_input": text, "session_id": f"bench-{uuid.uuid4().hex}"}, timeout=timeout
+                )
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                if not response.json().get("success"):
+                    failures += 1
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda value: round(value * 1000, 1)
+    return {
+        "concurrency": concurrency,
+        "requests": len(inputs),
+        "errors": errors,
+        "failures": failures,
+        "error_rate": round(errors / len(inputs), 4) if inputs else 0.0,
+        "rps": round(len(inputs) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": to_ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": to_ms(percentile(latencies, 50)),
+        "p95_ms": to_ms(percentile(latencies, 95)),
+        "p99_ms": to_ms(percentile(latencies, 99)),
+        "max_ms": to_ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+def print_table(results: List[Dict]):
+    columns = ["concurrency", "requests", "errors", "failures", "rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(" | ".join(f"{column:>11}" for column in columns))
+    print("-+-".join("-" * 11 for _ in columns))
+    for result in results:
+        print(" | ".join(f"{result[column]:>11}" for column in columns))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_port(port: int, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"模拟 MCP 服务未能在 {timeout} 秒内启动")
+
+
+def start_mock_server(args) -> Tuple[subprocess.Popen, str]:
+    """在子进程中启动模拟 MCP 服务，返回进程和 SSE 地址"""
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "bench.mock_mcp_server",
+        "--port", str(port),
+        "--latency-ms", str(args.mcp_latency_ms),
+        "--jitter-ms", str(args.mcp_jitter_ms),
+        "--failure-rate", str(args.mcp_failure_rate),
+        "--seed", str(args.seed),
+    ])
+    try:
+        _wait_port(port)
+    except Exception:
+        process.terminate()
+        raise
+    return process, f"http://127.0.0.1:{port}/sse"
+
+
+async def create_local_app(args, mcp_url: str):
+    """在进程内创建使用模拟LLM和模拟 MCP 服务的应用"""
+    # 基准测试不需要真实密钥，日志、追踪和持久缓存也不应干扰测量
+    for key, value in {
+        "AMAP_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "AMAP_MCP_URL": mcp_url,
+        "GEOCODE_CACHE_PATH": "",
+        "LLM_CACHE_PATH": "",
+        "SESSION_BACKEND": "memory",
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": os.devnull,
+        "TRACE_EXPORTER": "none",
+    }.items():
+        os.environ.setdefault(key, value)
+
+    import route_agent_api
+    from bench.fake_llm import FakeChatModel
+
+    llm = FakeChatModel(args.llm_latency_ms, args.llm_jitter_ms, args.llm_failure_rate, seed=args.seed)
+    agent = route_agent_api.SimpleRouteAgent(llm=llm, mcp_url=mcp_url)
+    await agent.initialize()
+    await agent.warm_up(15)
+    route_agent_api.route_agent = agent
+    return route_agent_api.app, agent
+
+
+async def main_async(args) -> List[Dict]:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    mock_process = None
+    agent = None
+    try:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url)
+        else:
+            mock_process, mcp_url = start_mock_server(args)
+            app, agent = await create_local_app(args, mcp_url)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+        results = []
+        async with client:
+            # 预热，不计入结果
+            await run_level(client, build_inputs(args.warmup, args.unique, args.seed + 1), min(levels), args.timeout)
+            for index, level in enumerate(levels):
+                inputs = build_inputs(args.requests, args.unique, args.seed + 2 + index)
+                results.append(await run_level(client, inputs, level, args.timeout))
+        return results
+    finally:
+        if agent:
+            await agent.close()
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/route 压测")
+    parser.add_argument("--url", help="压测已运行的服务，不指定时在进程内启动")
+    parser.add_argument("--concurrency", default="1,8,32", help="并发度列表，逗号分隔")
+    parser.add_argument("--requests", type=int, default=200, help="每个并发度发送的请求数")
+    parser.add_argument("--warmup", type=int, default=10, help="预热请求数")
+    parser.add_argument("--unique", action="store_true", help="每个请求使用不同地点，绕过缓存")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mcp-latency-ms", type=float, default=50)
+    parser.add_argument("--mcp-jitter-ms", type=float, default=20)
+    parser.add_argument("--mcp-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument("--max-p95-ms", type=float, help="任一并发度 p95 超过该值时返回非零状态")
+    parser.add_argument("--max-error-rate", type=float, help="任一并发度错误率超过该值时返回非零状态")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    violations = []
+    for result in results:
+        if args.max_p95_ms is not None and result["p95_ms"] > args.max_p95_ms:
+            violations.append(f"并发 {result['concurrency']}: p95 {result['p95_ms']}ms > {args.max_p95_ms}ms")
+        if args.max_error_rate is not None and result["error_rate"] > args.max_error_rate:
+            violations.append(f"并发 {result['concurrency']}: 错误率 {result['error_rate']} > {args.max_error_rate}")
+    for violation in violations:
+        print(f"❌ {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+模拟高德地图 MCP 服务（SSE）
+实现 maps_geo、maps_distance、maps_direction_walking、maps_direction_transit_integrated 四个工具，
+响应结构与高德返回一致；支持配置延迟和故障注入
+
+用法：
+    python -m bench.mock_mcp_server --port 8765 --latency-ms 50 --jitter-ms 20 --failure-rate 0.01
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+from typing import List, Tuple
+
+from mcp.server.fastmcp import FastMCP
+
+# 模拟地址落在深圳市区范围内
+_LNG_RANGE = (113.85, 114.25)
+_LAT_RANGE = (22.50, 22.70)
+
+
+class MockAmap:
+    """模拟高德地图数据，同一地址总是得到相同坐标"""
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 20, failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def simulate(self, tool_name: str):
+        """模拟网络和服务端耗时，按比例注入故障"""
+        self.calls += 1
+        delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if self.random.random() < self.failure_rate:
+            raise RuntimeError(f"模拟故障: {tool_name}")
+
+    @staticmethod
+    def locate(address: str) -> str:
+        digest = hashlib.md5(address.encode("utf-8")).digest()
+        lng = _LNG_RANGE[0] + (_LNG_RANGE[1] - _LNG_RANGE[0]) * digest[0] / 255
+        lat = _LAT_RANGE[0] + (_LAT_RANGE[1] - _LAT_RANGE[0]) * digest[1] / 255
+        return f"{lng:.6f},{lat:.6f}"
+
+    @staticmethod
+    def parse(coords: str) -> Tuple[float, float]:
+        lng, lat = coords.split(",")
+        return float(lng), float(lat)
+
+    @classmethod
+    def distance(cls, origin: str, destination: str) -> int:
+        """直线距离乘以绕行系数"""
+        lng1, lat1 = cls.parse(origin)
+        lng2, lat2 = cls.parse(destination)
+        x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+        y = math.radians(lat2 - lat1)
+        return int(6371008.8 * math.hypot(x, y) * 1.3)
+
+    def geo(self, address: str) -> dict:
+        return {"results": [{
+            "country": "中国",
+            "province": "广东省",
+            "city": "深圳市",
+            "citycode": "0755",
+            "district": "",
+            "adcode": "440300",
+            "location": self.locate(address),
+            "level": "兴趣点",
+        }]}
+
+    def distances(self, origins: List[str], destination: str) -> dict:
+        results = []
+        for index, origin in enumerate(origins, start=1):
+            distance = self.distance(origin, destination)
+            results.append({
+                "origin_id": str(index),
+                "dest_id": "1",
+                "distance": str(distance),
+                "duration": str(int(distance / 8)),
+            })
+        return {"results": results}
+
+    def walking(self, origin: str, destination: str) -> dict:
+        distance = self.distance(origin, destination)
+        steps = [
+            {"instruction": "向东步行", "road": "深南大道", "distance": str(distance // 2), "duration": str(distance // 2)},
+            {"instruction": "右转步行到达终点", "road": "", "distance": str(distance - distance // 2), "duration": str(distance - distance // 2)},
+        ]
+        return {"route": {"origin": origin, "destination": destination, "paths": [
+            {"distance": str(distance), "duration": str(distance), "steps": steps}
+        ]}}
+
+    def transit(self, origin: str, destination: str) -> dict:
+        distance = self.distance(origin, destination)
+        ride = max(distance - 600, 0)
+        segments = [{
+            "walking": {"distance": "300", "duration": "240", "steps": [{"instruction": "步行到地铁站", "distance": "300"}]},
+            "bus": {"buslines": [{
+                "name": "地铁1号线(罗宝线)",
+                "type": "地铁线路",
+                "departure_stop": {"name": "起点站"},
+                "arrival_stop": {"name": "终点站"},
+                "via_num": str(max(ride // 1200, 1)),
+                "distance": str(ride),
+                "duration": str(int(ride / 10)),
+                "price": "4",
+            }]},
+        }, {
+            "walking": {"distance": "300", "duration": "240", "steps": [{"instruction": "出站步行到达终点", "distance": "300"}]},
+        }]
+        return {"distance": str(distance), "transits": [{
+            "duration": str(int(ride / 10) + 480),
+            "walking_distance": "600",
+            "cost": "4",
+            "segments": segments,
+        }]}
+
+
+def create_server(amap: MockAmap, host: str = "127.0.0.1", port: int = 8765) -> FastMCP:
+    mcp = FastMCP("amap-mock", host=host, port=port, log_level="WARNING")
+
+    @mcp.tool()
+    async def maps_geo(address: str, city: str = "") -> str:
+        """将地址转换为经纬度坐标"""
+        await amap.simulate("maps_geo")
+        return json.dumps(amap.geo(address), ensure_ascii=False)
+
+    @mcp.tool()
+    async def maps_distance(origins: str, destination: str, type: str = "1") -> str:
+        """测量起点（多个用"|"分隔）到终点的距离"""
+        await amap.simulate("maps_distance")
+        return json.dumps(amap.distances(origins.split("|"), destination), ensure_ascii=False)
+
+    @mcp.tool()
+    async def maps_direction_walking(origin: str, destination: str) -> str:
+        """步行路径规划"""
+        await amap.simulate("maps_direction_walking")
+        return json.dumps(amap.walking(origin, destination), ensure_ascii=False)
+
+    @mcp.tool()
+    async def maps_direction_transit_integrated(origin: str, destination: str, city: str = "", cityd: str = "") -> str:
+        """公共交通路径规划"""
+        await amap.simulate("maps_direction_transit_integrated")
+        return json.dumps(amap.transit(origin, destination), ensure_ascii=False)
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟高德地图 MCP 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="每次工具调用的平均延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="延迟随机抖动范围（毫秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="工具调用失败比例（0~1）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    amap = MockAmap(args.latency_ms, args.jitter_ms, args.failure_rate, args.seed)
+    create_server(amap, args.host, args.port).run(transport="sse")
+
+
+if __name__ == "__main__":
+    main()
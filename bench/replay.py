@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+流量回放
+读取 TRAFFIC_RECORD_FILE 录制的 JSONL 文件（多 worker 录制的多个文件按时间合并），
+按原始时间间隔（或加速）向目标服务重新发送请求，同一会话内的请求严格按录制顺序依次发送，最后按接口输出延迟分布
+
+用法：
+    python -m bench.replay traffic.jsonl --url http://127.0.0.1:8000 --speed 1
+    python -m bench.replay traffic.*.jsonl --url http://127.0.0.1:8000
+    python -m bench.replay traffic.jsonl --url http://127.0.0.1:8000 --speed 10 --json replay.json
+--speed 0 表示不等待原始间隔，仅保持会话内顺序
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.load_test import percentile
+
+# 统计时把带会话ID的路径归并为同一个接口
+_SESSION_PATH = "/session/{session_id}"
+# 请求体未带会话ID时，服务端把这些对话接口的请求归入同一个 "default" 会话
+_DEFAULT_SESSION_PATHS = ("/route", "/route/stream")
+
+
+def load_records(paths: List[str]) -> List[Dict]:
+    """读取录制文件，合并后按时间排序"""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+def endpoint_of(record: Dict) -> str:
+    path = record["path"]
+    if path.startswith("/session/"):
+        path = _SESSION_PATH
+    return f"{record['method']} {path}"
+
+
+def session_of(record: Dict) -> Optional[str]:
+    """请求所属的会话；未带会话ID的对话请求在服务端共用 "default" 会话，其他请求不属于任何会话"""
+    if record.get("session_id"):
+        return record["session_id"]
+    if record["path"] in _DEFAULT_SESSION_PATHS:
+        return "default"
+    return None
+
+
+def rewrite(record: Dict, session_map: Dict[str, str]) -> Dict:
+    """把录制的会话ID替换为本次回放专用的会话ID，避免与目标服务上已有会话冲突"""
+    record = dict(record)
+    session_id = session_of(record)
+    if not session_id:
+        return record
+    new_id = session_map[session_id]
+    if isinstance(record.get("body"), dict) and ("session_id" in record["body"] or record["path"] in _DEFAULT_SESSION_PATHS):
+        record["body"] = dict(record["body"], session_id=new_id)
+    if record["path"].startswith("/session/"):
+        record["path"] = f"/session/{new_id}"
+    return record
+
+
+class ReplayStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lags: List[float] = []
+
+    def summary(self, elapsed: float) -> List[Dict]:
+        rows = []
+        total_latencies = []
+        total_errors = 0
+        endpoints = sorted(set(self.latencies) | set(self.errors))
+        for endpoint in endpoints:
+            latencies = sorted(self.latencies[endpoint])
+            total_latencies.extend(latencies)
+            total_errors += self.errors[endpoint]
+            rows.append(self._row(endpoint, latencies, self.errors[endpoint], elapsed))
+        rows.append(self._row("ALL", sorted(total_latencies), total_errors, elapsed))
+        return rows
+
+    @staticmethod
+    def _row(endpoint: str, latencies: List[float], errors: int, elapsed: float) -> Dict:
+        to_ms = lambda value: round(value * 1000, 1)
+        count = len(latencies) + errors
+        return {
+            "endpoint": endpoint,
+            "requests": count,
+            "errors": errors,
+            "rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "p50_ms": to_ms(percentile(latencies, 50)),
+            "p95_ms": to_ms(percentile(latencies, 95)),
+            "p99_ms": to_ms(percentile(latencies, 99)),
+            "max_ms": to_ms(latencies[-1]) if latencies else 0.0,
+        }
+
+
+async def send(client: httpx.AsyncClient, record: Dict, timeout: float) -> int:
+    """发送一条录制的请求，流式接口读取完整响应"""
+    request = client.build_request(record["method"], record["path"], json=record.get("body"), timeout=timeout)
+    response = await client.send(request, stream=True)
+    try:
+        await response.aread()
+    finally:
+        await response.aclose()
+    return response.status_code
+
+
+def group_sessions(records: List[Dict], prefix: str) -> List[List[Dict]]:
+    """按会话分组并改写会话ID，组内保持录制顺序"""
+    session_map: Dict[str, str] = defaultdict(lambda: f"{prefix}-{len(session_map)}")
+    sessions: Dict[str, List[Dict]] = defaultdict(list)
+    for index, record in enumerate(records):
+        # 不属于任何会话的请求（如批量规划）各自独立
+        sessions[session_of(record) or f"__single_{index}"].append(rewrite(record, session_map))
+    return list(sessions.values())
+
+
+async def replay(records: List[Dict], url: str, speed: float, timeout: float,
+                 session_prefix: Optional[str] = None) -> List[Dict]:
+    """按会话分组回放；不同会话并发，同一会话按顺序"""
+    sessions = group_sessions(records, session_prefix or f"replay-{uuid.uuid4().hex[:8]}")
+
+    stats = ReplayStats()
+    origin = records[0]["ts"] if records else 0
+    started = time.perf_counter()
+
+    async def run_session(session_records: List[Dict]):
+        for record in session_records:
+            if speed > 0:
+                due = started + (record["ts"] - origin) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -0.01:
+                    # 前一个请求太慢，导致本请求晚于预定时间发出
+                    stats.lags.append(-delay)
+            endpoint = endpoint_of(record)
+            start = time.perf_counter()
+            try:
+                status = await send(client, record, timeout)
+            except Exception:
+                stats.errors[endpoint] += 1
+                continue
+            if status >= 500:
+                stats.errors[endpoint] += 1
+            else:
+                stats.latencies[endpoint].append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=url) as client:
+        await asyncio.gather(*(run_session(session_records) for session_records in sessions))
+    elapsed = time.perf_counter() - started
+
+    rows = stats.summary(elapsed)
+    if stats.lags:
+        lags = sorted(stats.lags)
+        print(f"⏱️ {len(lags)} 个请求晚于录制节奏发出，p95 滞后 {percentile(lags, 95) * 1000:.1f}ms")
+    return rows
+
+
+def print_table(rows: List[Dict]):
+    width = max(len(row["endpoint"]) for row in rows)
+    columns = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(f"{'endpoint':<{width}} | " + " | ".join(f"{column:>9}" for column in columns))
+    print("-" * width + "-+-" + "-+-".join("-" * 9 for _ in columns))
+    for row in rows:
+        print(f"{row['endpoint']:<{width}} | " + " | ".join(f"{row[column]:>9}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的流量")
+    parser.add_argument("files", nargs="+", help="TRAFFIC_RECORD_FILE 录制的 JSONL 文件，可指定多个")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="目标服务地址")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待原始间隔")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--session-prefix", help="回放会话ID前缀，默认随机生成")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    records = load_records(args.files)
+    if not records:
+        print("❌ 录制文件为空")
+        sys.exit(1)
+    print(f"▶️ 回放 {len(records)} 个请求，{len({session_of(r) for r in records} - {None})} 个会话，{args.speed}x")
+    rows = asyncio.run(replay(records, args.url, args.speed, args.timeout, args.session_prefix))
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
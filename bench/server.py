@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+基准测试用服务端
+与 route_agent_api:app 相同，但智能体使用模拟LLM，MCP 服务由 AMAP_MCP_URL 指定（通常为模拟服务），
+供 bench/load_test.py --url 和 bench/replay.py 离线压测多 worker 部署：
+
+    python -m bench.mock_mcp_server --port 8765 &
+    AMAP_MCP_URL=http://127.0.0.1:8765/sse python -m uvicorn bench.server:app --port 8000 --workers 4
+"""
+
+import functools
+import os
+
+os.environ.setdefault("AMAP_API_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import route_agent_api
+from bench.fake_llm import FakeChatModel
+
+# 模拟LLM的延迟和故障比例
+BENCH_LLM_LATENCY_MS = float(os.getenv("BENCH_LLM_LATENCY_MS", "300"))
+BENCH_LLM_JITTER_MS = float(os.getenv("BENCH_LLM_JITTER_MS", "100"))
+BENCH_LLM_FAILURE_RATE = float(os.getenv("BENCH_LLM_FAILURE_RATE", "0"))
+
+# startup 事件按名称调用 init_agent，替换后即使用模拟LLM
+route_agent_api.init_agent = functools.partial(
+    route_agent_api.init_agent,
+    llm=FakeChatModel(BENCH_LLM_LATENCY_MS, BENCH_LLM_JITTER_MS, BENCH_LLM_FAILURE_RATE),
+)
+
+app = route_agent_api.app
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+缓存组件
+内存 LRU + SQLite 持久化的两级缓存，用于减少重复的远程调用
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from route_model import Route
+
+logger = logging.getLogger(__name__)
+
+# 每张 SQLite 缓存表的最大条目数，0 为不限制
+CACHE_DISK_MAX_ROWS = int(os.getenv("CACHE_DISK_MAX_ROWS", "100000"))
+# 清理过期条目的间隔（秒），0 为不清理
+CACHE_PURGE_INTERVAL = float(os.getenv("CACHE_PURGE_INTERVAL", "600"))
+
+# 缓存未命中标记（区别于值为 None 的负缓存）
+MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、去除空白、统一小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", "", text).lower()
+
+
+class LRUCache:
+    """带过期时间的内存 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        """读取缓存，未命中或已过期返回 MISSING"""
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """基于 SQLite 的键值持久化存储，多个进程可共享同一文件
+
+    - 读取在调用方线程完成（WAL 模式下读不会等待写锁）
+    - 写入和删除入队，由后台线程批量提交，不阻塞事件循环
+    - 后台线程定期清理过期条目，并在条目数超过上限时淘汰最早过期的条目
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_rows: int = None, purge_interval: float = None):
+        self.path = path
+        self.table = table
+        self.max_rows = CACHE_DISK_MAX_ROWS if max_rows is None else max_rows
+        self.purge_interval = CACHE_PURGE_INTERVAL if purge_interval is None else purge_interval
+        self.purged = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+            self._conn.commit()
+        self._queue: "queue.SimpleQueue[Optional[Tuple]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name=f"sqlite-{table}", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 不会损坏数据库，断电时最多丢失最近的缓存写入
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """读取条目，返回 (过期时间, 值)；未找到或已过期返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return expires_at, json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._queue.put(("set", key, json.dumps(value, ensure_ascii=False), time.time() + ttl))
+
+    def delete(self, key: str):
+        self._queue.put(("delete", key))
+
+    def _write_loop(self):
+        conn = self._connect()
+        # purge_interval 不大于 0 时不定期清理
+        next_purge = time.monotonic() + self.purge_interval if self.purge_interval > 0 else None
+        closing = False
+        while not closing:
+            ops = []
+            try:
+                timeout = None if next_purge is None else max(0.0, next_purge - time.monotonic())
+                ops.append(self._queue.get(timeout=timeout))
+                # 取出已入队的全部操作，在一个事务中提交
+                while len(ops) < 1000:
+                    ops.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in ops:
+                closing = True
+                ops = [op for op in ops if op is not None]
+            try:
+                if ops:
+                    self._apply(conn, ops)
+                if next_purge is not None and time.monotonic() >= next_purge:
+                    self.purged += self.purge(conn)
+                    next_purge = time.monotonic() + self.purge_interval
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 缓存写入失败（{self.table}）: {e}")
+        conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, ops):
+        with conn:
+            for op in ops:
+                if op[0] == "set":
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)", op[1:]
+                    )
+                else:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", op[1:])
+
+    def purge(self, conn: sqlite3.Connection) -> int:
+        """清理过期条目，条目数超过上限时淘汰最早过期的条目，返回清理数量"""
+        with conn:
+            removed = conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),)
+            ).rowcount
+            if self.max_rows > 0:
+                excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    removed += conn.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)", (excess,)
+                    ).rowcount
+        return removed
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        """写入队列中剩余的操作后关闭"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+
+class GeocodeCache:
+    """地理编码两级缓存
+
+    - 第一级：内存 LRU
+    - 第二级：SQLite 文件（可选，path 为空时禁用）
+    - 解析失败的地址以 None 作为负缓存，使用较短的 TTL
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 2048,
+                 ttl: float = 7 * 24 * 3600, negative_ttl: float = 300):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteStore(path, "geocode") if path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "GeocodeCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            path=os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.db"),
+            max_entries=int(os.getenv("GEOCODE_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("GEOCODE_CACHE_TTL", str(7 * 24 * 3600))),
+            negative_ttl=float(os.getenv("GEOCODE_NEGATIVE_TTL", "300")),
+        )
+
+    def get(self, address: str) -> Tuple[bool, Optional[Any]]:
+        """查询缓存，返回 (是否命中, 缓存值)；命中负缓存时缓存值为 None"""
+        key = normalize_text(address)
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self.memory_hits += 1
+        elif self.disk:
+            item = self.disk.get(key)
+            if item is not None:
+                expires_at, value = item
+                # 回填内存，保持与磁盘一致的剩余有效期
+                self.memory.set(key, value, expires_at - time.time())
+                self.disk_hits += 1
+
+        if value is MISSING:
+            self.misses += 1
+            return False, None
+        if value is None:
+            self.negative_hits += 1
+        return True, value
+
+    def set(self, address: str, value: Any):
+        """写入解析成功的结果"""
+        self._store(normalize_text(address), value, self.ttl)
+
+    def set_negative(self, address: str):
+        """写入解析失败的负缓存"""
+        self._store(normalize_text(address), None, self.negative_ttl)
+
+    def _store(self, key: str, value: Any, ttl: float):
+        self.memory.set(key, value, ttl)
+        if self.disk:
+            self.disk.set(key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk.count() if self.disk else 0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
+
+
+class DivisionIndex:
+    """行政区划索引：坐标 -> 所在城市（城市名称、citycode、adcode）
+
+    地理编码结果中已包含行政区划信息，编码成功时顺带记录，供公共交通规划按城市查询；
+    行政区划极少变化，与地理编码缓存共用 SQLite 文件并长期保存
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 4096, ttl: float = 30 * 24 * 3600):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteStore(path, "division") if path else None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "DivisionIndex":
+        """根据环境变量创建索引"""
+        return cls(
+            path=os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.db"),
+            max_entries=int(os.getenv("DIVISION_INDEX_SIZE", "4096")),
+            ttl=float(os.getenv("DIVISION_INDEX_TTL", str(30 * 24 * 3600))),
+        )
+
+    @staticmethod
+    def parse(item: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """从地理编码/逆地理编码结果中提取行政区划；直辖市的 city 可能为空，使用 province"""
+        def text(key: str) -> str:
+            value = item.get(key)
+            return value if isinstance(value, str) else ""
+
+        city = text("city") or text("province")
+        citycode = text("citycode")
+        if not city and not citycode:
+            return None
+        return {"city": city, "citycode": citycode, "adcode": text("adcode")}
+
+    def get(self, location: str) -> Optional[Dict[str, str]]:
+        key = location.strip()
+        value = self.memory.get(key)
+        if value is MISSING and self.disk:
+            item = self.disk.get(key)
+            if item is not None:
+                expires_at, value = item
+                self.memory.set(key, value, expires_at - time.time())
+        if value is MISSING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, location: str, division: Dict[str, str]):
+        key = location.strip()
+        self.memory.set(key, division, self.ttl)
+        if self.disk:
+            self.disk.set(key, division, self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk.count() if self.disk else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
+
+
+class RouteCache:
+    """路线规划结果缓存
+
+    键由量化后的起终点坐标和出行方式组成；公共交通结果依赖时刻表，
+    额外按一天中的时段分桶，并使用较短的 TTL
+    """
+
+    def __init__(self, max_entries: int = 1024, precision: int = 4,
+                 walking_ttl: float = 24 * 3600, transit_ttl: float = 900,
+                 bucket_minutes: int = 30):
+        self.precision = precision
+        self.walking_ttl = walking_ttl
+        self.transit_ttl = transit_ttl
+        self.bucket_minutes = max(1, bucket_minutes)
+        self.memory = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "RouteCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            max_entries=int(os.getenv("ROUTE_CACHE_SIZE", "1024")),
+            precision=int(os.getenv("ROUTE_CACHE_PRECISION", "4")),
+            walking_ttl=float(os.getenv("ROUTE_CACHE_WALKING_TTL", str(24 * 3600))),
+            transit_ttl=float(os.getenv("ROUTE_CACHE_TRANSIT_TTL", "900")),
+            bucket_minutes=int(os.getenv("ROUTE_CACHE_BUCKET_MINUTES", "30")),
+        )
+
+    def _quantize(self, coords: str) -> str:
+        """坐标按精度取整，相近的坐标共享同一缓存条目"""
+        try:
+            lng, lat = (float(part) for part in coords.split(","))
+        except ValueError:
+            return coords.strip()
+        return f"{lng:.{self.precision}f},{lat:.{self.precision}f}"
+
+    def make_key(self, mode: str, start_coords: str, end_coords: str) -> str:
+        key = f"{mode}|{self._quantize(start_coords)}|{self._quantize(end_coords)}"
+        if mode == "transit":
+            now = time.localtime()
+            key += f"|{(now.tm_hour * 60 + now.tm_min) // self.bucket_minutes}"
+        return key
+
+    def get(self, mode: str, start_coords: str, end_coords: str) -> Optional[Route]:
+        route = self.memory.get(self.make_key(mode, start_coords, end_coords))
+        if route is MISSING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return route
+
+    def set(self, mode: str, start_coords: str, end_coords: str, route: Route):
+        """缓存解析后的路线，不保存原始响应数据"""
+        route = route.without_raw()
+        ttl = self.transit_ttl if mode == "transit" else self.walking_ttl
+        self.memory.set(self.make_key(mode, start_coords, end_coords), route, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def normalize_prompt(text: str) -> str:
+    """规范化提示词：全角转半角、去除空白和标点、统一小写"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and not unicodedata.category(ch).startswith("P")
+    )
+
+
+class LLMResponseCache:
+    """LLM响应缓存
+
+    键为 阶段名 + 规范化后的提示词摘要；各阶段可设置不同的 TTL，
+    可选 SQLite 持久化（path 为空时只使用内存）
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1024,
+                 default_ttl: float = 24 * 3600, stage_ttls: Optional[Dict[str, float]] = None):
+        self.default_ttl = default_ttl
+        self.stage_ttls = stage_ttls or {}
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteStore(path, "llm_response") if path else None
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        """根据环境变量创建缓存，LLM_CACHE_STAGE_TTLS 格式如 "intent=3600,city=600" """
+        stage_ttls = {}
+        for item in os.getenv("LLM_CACHE_STAGE_TTLS", "").split(","):
+            if "=" in item:
+                stage, ttl = item.split("=", 1)
+                stage_ttls[stage.strip()] = float(ttl)
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", ""),
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            default_ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+            stage_ttls=stage_ttls,
+        )
+
+    @staticmethod
+    def make_key(stage: str, prompt: str) -> str:
+        digest = hashlib.sha1(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+        return f"{stage}|{digest}"
+
+    def get(self, stage: str, prompt: str) -> Optional[str]:
+        """查询缓存的响应内容，未命中返回 None"""
+        key = self.make_key(stage, prompt)
+        value = self.memory.get(key)
+        if value is MISSING and self.disk:
+            item = self.disk.get(key)
+            if item is not None:
+                expires_at, value = item
+                self.memory.set(key, value, expires_at - time.time())
+        if value is MISSING:
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+            return None
+        self.hits[stage] = self.hits.get(stage, 0) + 1
+        return value
+
+    def set(self, stage: str, prompt: str, content: str):
+        key = self.make_key(stage, prompt)
+        ttl = self.stage_ttls.get(stage, self.default_ttl)
+        if ttl <= 0:
+            return
+        self.memory.set(key, content, ttl)
+        if self.disk:
+            self.disk.set(key, content, ttl)
+
+    def discard(self, stage: str, prompt: str):
+        """删除条目（响应无法解析时调用，避免缓存错误结果）"""
+        key = self.make_key(stage, prompt)
+        self.memory.delete(key)
+        if self.disk:
+            self.disk.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        stages = sorted(set(self.hits) | set(self.misses))
+        return {
+            "size": len(self.memory),
+            "stages": {
+                stage: {
+                    "hits": self.hits.get(stage, 0),
+                    "misses": self.misses.get(stage, 0),
+                }
+                for stage in stages
+            },
+        }
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
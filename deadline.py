@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+请求时间预算
+每个请求的截止时间由请求头 X-Request-Timeout（秒）或默认配置决定，经 contextvars 传递到各步骤；
+LLM 和 MCP 调用以剩余预算为超时，预算用完或客户端断开时取消仍在进行的处理
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Sequence
+
+from metrics import REQUESTS_CANCELLED
+from tracing import set_attribute
+
+logger = logging.getLogger(__name__)
+
+# 默认请求时间预算（秒），0 表示只在请求头指定时才有预算
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+# 请求头可指定的最大预算（秒），0 表示不限制
+REQUEST_DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "120"))
+# 启用时间预算和断开检测的路径
+REQUEST_DEADLINE_PATHS = tuple(
+    path for path in os.getenv("REQUEST_DEADLINE_PATHS", "/route,/route/stream").split(",") if path
+)
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+class Deadline:
+    """截止时间（time.monotonic() 时刻），None 表示不限；多个请求共享同一次调用时可延长"""
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: Optional[float]):
+        self.at = at
+
+    def extend(self, at: Optional[float]):
+        """延长到 at（不会缩短）；at 为 None 时取消限制"""
+        if self.at is not None and (at is None or at > self.at):
+            self.at = at
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求时间预算已用完"""
+
+
+def current_deadline() -> Optional[float]:
+    """当前请求的截止时刻，没有预算时返回 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.at
+
+
+def remaining() -> Optional[float]:
+    """当前请求剩余的预算（秒），没有预算时返回 None"""
+    at = current_deadline()
+    return None if at is None else at - time.monotonic()
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]):
+    """在代码块内使用给定的截止时间对象（其后创建的任务共享该对象）"""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """在代码块内设置时间预算；seconds 为 None 时清除预算（如脱离请求的后台任务）"""
+    with use_deadline(None if seconds is None else Deadline(time.monotonic() + seconds)):
+        yield
+
+
+async def call_with_deadline(awaitable):
+    """以剩余预算为超时等待；预算已用完时不再发起调用，等待期间预算被延长时继续等待"""
+    deadline = _deadline.get()
+    if deadline is None or deadline.at is None:
+        return await awaitable
+    if deadline.at <= time.monotonic():
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("请求时间预算已用完")
+    started = time.monotonic()
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            timeout = None if deadline.at is None else deadline.at - time.monotonic()
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                # 被调用方自身的异常（包括其自身的超时）原样抛出
+                return task.result()
+            if deadline.at is not None and time.monotonic() >= deadline.at:
+                # 与 asyncio.wait_for 一致：先取消并等待被调用方结束，再抛出超时
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise DeadlineExceeded(f"超出请求时间预算（{time.monotonic() - started:.1f}秒）")
+    finally:
+        task.cancel()
+
+
+class DeadlineTool:
+    """以剩余预算为超时调用 MCP 工具的包装"""
+
+    __slots__ = ("tool", "name")
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+
+    async def ainvoke(self, arguments, **kwargs):
+        return await call_with_deadline(self.tool.ainvoke(arguments, **kwargs))
+
+
+class DeadlineMiddleware:
+    """ASGI 中间件：为匹配路径的请求设置时间预算
+
+    预算用完时取消处理并返回 504（已开始流式响应时结束响应体），客户端断开时同样取消处理
+    """
+
+    def __init__(self, app, paths: Sequence[str] = REQUEST_DEADLINE_PATHS,
+                 default: float = REQUEST_DEADLINE, maximum: float = REQUEST_DEADLINE_MAX):
+        self.app = app
+        self.paths = set(paths)
+        self.default = default
+        self.maximum = maximum
+
+    def budget(self, scope) -> Optional[float]:
+        """请求头中的合法预算优先，否则使用默认预算"""
+        header = DEADLINE_HEADER.lower().encode()
+        for key, value in scope.get("headers", ()):
+            if key == header:
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    break
+                if seconds > 0:
+                    return min(seconds, self.maximum) if self.maximum > 0 else seconds
+                break
+        return self.default if self.default > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.budget(scope)
+        body_received = asyncio.Event()
+        response_started = False
+        response_finished = False
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.disconnect" or not message.get("more_body"):
+                body_received.set()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started, response_finished
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response_finished = True
+            await send(message)
+
+        async def wait_disconnect():
+            # 请求体读完后，receive 只会返回断开事件
+            await body_received.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        # 在独立任务中处理请求，任务复制当前上下文，预算随之传递到各步骤
+        with deadline_scope(budget):
+            task = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        watcher = asyncio.ensure_future(wait_disconnect())
+        if budget is not None:
+            set_attribute("deadline_ms", round(budget * 1000))
+        try:
+            done, _ = await asyncio.wait({task, watcher}, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            watcher.cancel()
+
+        if task in done or response_finished:
+            # 响应已发送完毕时断开事件属于正常结束
+            await task
+            return
+
+        reason = "disconnect" if watcher in done else "deadline"
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        REQUESTS_CANCELLED.inc(scope["path"], reason)
+        set_attribute("cancelled", reason)
+        if reason == "deadline":
+            logger.warning(f"⏱️ 请求超出时间预算 {budget:g} 秒，已取消: {scope['path']}")
+            if not response_started:
+                body = json.dumps({"detail": "请求处理超时"}, ensure_ascii=False).encode("utf-8")
+                await send({"type": "http.response.start", "status": 504,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+            else:
+                # 流式响应已开始，结束响应体
+                await send({"type": "http.response.body", "body": b""})
+        else:
+            logger.info(f"🔌 客户端已断开，取消处理: {scope['path']}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+本地距离估算
+基于球面大圆距离（haversine）计算 "经度,纬度" 坐标间的直线距离，支持向量化批量计算
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 地球平均半径（米）
+EARTH_RADIUS_M = 6371008.8
+
+
+def parse_lnglat(coords: str) -> Tuple[float, float]:
+    """解析 "经度,纬度" 字符串"""
+    try:
+        lng, lat = (float(part) for part in coords.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError(f"无效的坐标: {coords!r}")
+    if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+        raise ValueError(f"坐标超出范围: {coords!r}")
+    return lng, lat
+
+
+def parse_lnglat_array(coords_list: Iterable[str]) -> np.ndarray:
+    """批量解析坐标，返回形状为 (N, 2) 的 [经度, 纬度] 数组"""
+    return np.array([parse_lnglat(coords) for coords in coords_list], dtype=np.float64).reshape(-1, 2)
+
+
+def haversine(lng1, lat1, lng2, lat2) -> np.ndarray:
+    """大圆距离（米），参数支持标量或可广播的数组"""
+    lng1, lat1, lng2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lng1, lat1, lng2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimate_distance(start_coords: str, end_coords: str) -> int:
+    """估算两个 "经度,纬度" 坐标之间的直线距离（米）"""
+    lng1, lat1 = parse_lnglat(start_coords)
+    lng2, lat2 = parse_lnglat(end_coords)
+    return int(round(float(haversine(lng1, lat1, lng2, lat2))))
+
+
+def pairwise_distances(origins: Iterable[str], destinations: Iterable[str]) -> np.ndarray:
+    """计算起点与终点两两之间的直线距离矩阵，形状为 (起点数, 终点数)"""
+    o = parse_lnglat_array(origins)
+    d = parse_lnglat_array(destinations)
+    return haversine(o[:, None, 0], o[:, None, 1], d[None, :, 0], d[None, :, 1])
+
+
+def is_lnglat(text: str) -> bool:
+    """判断字符串是否为有效的 "经度,纬度" 坐标"""
+    try:
+        parse_lnglat(text.strip().replace(" ", ""))
+        return True
+    except ValueError:
+        return False
+
+
+@dataclass
+class DistanceMatrix:
+    """距离矩阵结果，行为起点、列为终点，无法获取的单元为 NaN"""
+    origins: List[str]
+    destinations: List[str]
+    distances: np.ndarray  # 米
+    durations: np.ndarray  # 秒
+
+    @classmethod
+    def empty(cls, origins: List[str], destinations: List[str]) -> "DistanceMatrix":
+        shape = (len(origins), len(destinations))
+        return cls(origins, destinations, np.full(shape, np.nan), np.full(shape, np.nan))
+
+    @classmethod
+    def straight_line(cls, origins: List[str], destinations: List[str]) -> "DistanceMatrix":
+        """本地计算的直线距离矩阵，没有耗时数据"""
+        matrix = cls.empty(origins, destinations)
+        matrix.distances = np.rint(pairwise_distances(origins, destinations))
+        return matrix
+
+    def nearest(self) -> List[Optional[int]]:
+        """每个起点最近的终点下标，全部缺失时为 None"""
+        result = []
+        for row in self.distances:
+            valid = ~np.isnan(row)
+            result.append(int(np.nanargmin(row)) if valid.any() else None)
+        return result
+
+    def to_dict(self) -> Dict:
+        """转换为可 JSON 序列化的结构，NaN 输出为 None"""
+        def to_list(matrix: np.ndarray) -> List[List[Optional[int]]]:
+            return [[None if np.isnan(v) else int(v) for v in row] for row in matrix]
+        nearest = self.nearest()
+        return {
+            "origins": self.origins,
+            "destinations": self.destinations,
+            "distances": to_list(self.distances),
+            "durations": to_list(self.durations),
+            "nearest": [
+                None if j is None else {"destination_index": j, "distance": int(self.distances[i, j])}
+                for i, j in enumerate(nearest)
+            ],
+        }
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+规则意图解析
+对 "从A到B怎么走"、"A到B"、"我想从A去B" 等固定句式直接提取起终点，无需调用LLM
+没有 "从" 的句式只接受 "到"，"A去B" 多为 "送我去机场"、"他们去哪了" 这类非起终点表达
+"""
+
+import re
+import unicodedata
+from typing import Dict, Optional
+
+# 句首的礼貌用语/引导词
+_PREFIX = r"(?:请问|麻烦|帮我|请|我想|我要|我打算|想|要|查一下|查询|规划一下|规划|看看|导航)*"
+# 起终点之间的连接词；"去"、"前往" 只在有 "从" 时作为连接词
+_CONNECTOR = r"(?:到|去|至|前往)"
+_BARE_CONNECTOR = r"到"
+# 句尾的疑问/描述
+_SUFFIX = (
+    r"(?:的(?:路线|路径|线路|路|交通方式|走法)|路线|路径|线路|怎么走|怎么去|怎样走|怎样去|如何走|如何去|"
+    r"怎么坐车|坐什么车|乘什么车|要多久|多远|怎么到)?"
+    r"(?:呢|啊|呀|吧)?"
+)
+# 地点：不含连接词、空白和标点；非贪婪匹配，避免吞入句尾疑问词
+_PLACE = r"([^\s到去至从，,。？?！!]{2,30}?)"
+
+_ROUTE_PATTERNS = [
+    # 从A到B（怎么走/的路线）、我想从A去B
+    re.compile(rf"^{_PREFIX}(?:怎么|如何)?从{_PLACE}{_CONNECTOR}{_PLACE}{_SUFFIX}$"),
+    # A到B（怎么走）
+    re.compile(rf"^{_PREFIX}{_PLACE}{_BARE_CONNECTOR}{_PLACE}{_SUFFIX}$"),
+]
+
+# 出现这些词时可能是纠错或复杂需求，交给LLM处理
+_AMBIGUOUS_WORDS = re.compile(
+    r"不对|错了|应该是|不是|而是|改成|换成|开车|驾车|骑行|打车|经过|途经|然后|再去|"
+    r"今天|明天|后天|现在|几点|上午|下午|晚上|早上|回家|这里|那里|附近"
+)
+
+# 地点名被句式吞入的残留词（代词、动作、打算、时间）或疑问词，出现时说明拆分不可靠
+_BAD_PLACE_PARTS = re.compile(
+    r"^(?:怎么|如何|我|你|他|她|它|咱|大家|的|导航|查询|查|规划|请问|帮|送|接|坐|乘|搭|骑|开|"
+    r"打算|准备|计划|想|要|明早|明晚|今早|今晚|待会|等会|一会|马上|刚)"
+    r"|(?:怎么|如何|的)$|哪|什么|谁"
+)
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s。．.？?！!~～]+$")
+
+
+class IntentRuleParser:
+    """基于正则句式的意图快速解析器，命中时返回与LLM意图识别相同的结构"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.matches = 0
+
+    def parse(self, user_input: str) -> Optional[Dict]:
+        """解析用户输入，无法确定时返回 None 交由LLM处理"""
+        self.attempts += 1
+        text = unicodedata.normalize("NFKC", user_input or "").strip()
+        text = _TRAILING_PUNCTUATION.sub("", text)
+        text = re.sub(r"\s+", "", text)
+
+        if not text or _AMBIGUOUS_WORDS.search(text):
+            return None
+
+        for pattern in _ROUTE_PATTERNS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            start, end = match.group(1), match.group(2)
+            if start == end or _BAD_PLACE_PARTS.search(start) or _BAD_PLACE_PARTS.search(end):
+                return None
+            self.matches += 1
+            return {
+                "intent_type": "route_request",
+                "locations": [start, end]
+            }
+        return None
+
+    def stats(self) -> Dict:
+        """命中统计：命中率即被规则直接处理、无需LLM的请求比例"""
+        return {
+            "attempts": self.attempts,
+            "matches": self.matches,
+            "match_rate": round(self.matches / self.attempts, 4) if self.attempts else 0.0,
+        }
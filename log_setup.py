@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+日志配置
+日志记录经队列交给后台线程写入文件和控制台，事件循环线程只负责入队；
+文件输出为紧凑的 JSON Lines，提示词和LLM响应正文按配置采样并截断
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+# 日志文件路径，可包含 {pid} 占位符使多个 worker 各写一个文件
+LOG_FILE = os.getenv("LOG_FILE", "route_agent.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# 文件日志格式：json（每行一条 JSON 记录）或 text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# 提示词/响应正文的记录比例（0~1）和最大字符数（0 表示不截断）
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0.1"))
+LOG_BODY_MAX_CHARS = int(os.getenv("LOG_BODY_MAX_CHARS", "500"))
+
+# LogRecord 自带的属性，其余属性视为 extra 字段写入 JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """每条记录输出为一行紧凑 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """控制台文本格式，带正文的记录在消息后追加正文"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        body = getattr(record, "body", None)
+        return f"{text}\n{body}" if body is not None else text
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """同进程内的队列处理器：只合并消息参数，格式化和写入都在监听线程完成"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JSONLWriter:
+    """在后台线程把字典逐行追加写入 JSONL 文件，调用方只负责入队；
+    max_bytes 大于 0 时按大小轮转，与日志文件一样保留 backup_count 个旧文件（path.1、path.2…）"""
+
+    def __init__(self, path: str, name: str = "jsonl-writer", max_bytes: int = 0, backup_count: int = 0):
+        self.path = path.format(pid=os.getpid())
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, item: Dict[str, Any]):
+        self._queue.put(item)
+
+    def _rotate(self):
+        """依次后移旧文件，当前文件改名为 path.1；backup_count 为 0 时直接清空"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _write_loop(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                line = json.dumps(item, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+                if self.max_bytes > 0 and f.tell() > 0 and f.tell() + len(line.encode("utf-8")) > self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                f.write(line)
+                # 队列暂时为空时才刷新，批量写入
+                if self._queue.empty():
+                    f.flush()
+        finally:
+            f.close()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def truncate_body(text: str, max_chars: int = None) -> str:
+    """截断过长的正文，保留开头并注明原长度"""
+    max_chars = LOG_BODY_MAX_CHARS if max_chars is None else max_chars
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}…(共{len(text)}字符)"
+
+
+def log_body(logger: logging.Logger, label: str, *parts, stage: str = None):
+    """按采样比例记录提示词或LLM响应正文，多段正文换行拼接；未采样时不做任何拼接和格式化"""
+    if not logger.isEnabledFor(logging.INFO) or random.random() >= LOG_BODY_SAMPLE_RATE:
+        return
+    text = "\n".join(str(part) for part in parts)
+    extra = {"body": truncate_body(text), "chars": len(text)}
+    if stage:
+        extra["stage"] = stage
+    logger.info(label, extra=extra)
+
+
+def _fix_windows_console():
+    """在Windows下处理控制台编码问题"""
+    if not sys.platform.startswith('win'):
+        return None
+    try:
+        # 尝试设置控制台为UTF-8
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'ignore')
+        sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'ignore')
+        return None
+    except Exception:
+        # 如果设置失败，就使用错误忽略模式
+        return 'ignore'
+
+
+def setup_logging(logger_names: Iterable[str]) -> logging.handlers.QueueListener:
+    """为指定 logger 挂上队列处理器，并启动后台线程写入文件和控制台（重复调用只启动一次）"""
+    global _listener
+    level = getattr(logging, LOG_LEVEL, logging.INFO)
+    if _listener is None:
+        console_errors = _fix_windows_console()
+
+        # 文件处理器
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE.format(pid=os.getpid()),
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5,
+            encoding='utf-8'  # 明确指定编码
+        )
+        file_handler.setFormatter(JSONLinesFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        # 控制台处理器
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(TextFormatter())
+        if console_errors:
+            console_handler.stream.errors = console_errors
+
+        _listener = logging.handlers.QueueListener(
+            queue.SimpleQueue(), file_handler, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(stop_logging)
+
+    queue_handler = _InProcessQueueHandler(_listener.queue)
+    for name in logger_names:
+        target = logging.getLogger(name)
+        target.setLevel(level)
+        for handler in list(target.handlers):
+            if isinstance(handler, _InProcessQueueHandler):
+                target.removeHandler(handler)
+        target.addHandler(queue_handler)
+        # 防止重复日志
+        target.propagate = False
+    return _listener
+
+
+def stop_logging():
+    """停止后台线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+MCP 工具注册表
+按名称索引高德地图 MCP 工具，后台定期健康检查，连接断开时指数退避重连；
+可选维护多个常驻 MCP 会话组成的连接池，并发请求分摊到各个连接上
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+logger = logging.getLogger(__name__)
+
+
+class NoConnectionError(RuntimeError):
+    """连接池中没有可用于该工具的连接（通常正在重连）"""
+
+
+class PooledConnection:
+    """连接池中的一个常驻 MCP 会话，带独立的并发上限和延迟统计"""
+
+    def __init__(self, index: int, client: MultiServerMCPClient, server_name: str, max_in_flight: int):
+        self.index = index
+        self.client = client
+        self.server_name = server_name
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.session = None
+        self.tools: Dict[str, Any] = {}
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=256)
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.error: Optional[BaseException] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done() and bool(self.tools)
+
+    async def open(self, timeout: float):
+        """在后台任务中打开会话并加载工具（会话的进入和退出须在同一任务内）"""
+        self._task = asyncio.create_task(self._hold())
+        await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        if self.error:
+            raise self.error
+
+    async def _hold(self):
+        try:
+            async with self.client.session(self.server_name) as session:
+                self.session = session
+                self.tools = {tool.name: tool for tool in await load_mcp_tools(session)}
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self.error = e
+            logger.warning(f"⚠️ MCP连接#{self.index}已断开: {e}")
+        finally:
+            self.tools = {}
+            self.session = None
+            self._ready.set()
+
+    async def ping(self, timeout: float):
+        if not self.alive:
+            raise RuntimeError(f"连接#{self.index}不可用")
+        await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+
+    async def invoke(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        async with self.semaphore:
+            self.in_flight += 1
+            start = time.perf_counter()
+            try:
+                return await self.tools[tool_name].ainvoke(arguments)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.calls += 1
+                self.latencies.append(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "index": self.index,
+            "alive": self.alive,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else None,
+        }
+
+    async def close(self):
+        self._closing.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+
+
+class ConnectionPool:
+    """多个常驻 MCP 会话组成的连接池，按最少在途请求或轮询分发工具调用"""
+
+    def __init__(self, connections: List[PooledConnection], dispatch: str = "least_loaded",
+                 on_failure: Optional[Callable[[Any], None]] = None):
+        self.connections = connections
+        self.dispatch = dispatch
+        self.on_failure = on_failure
+        self._round_robin = itertools.count()
+
+    @classmethod
+    async def open(cls, client: MultiServerMCPClient, server_name: str, size: int, max_in_flight: int,
+                   timeout: float, dispatch: str = "least_loaded",
+                   on_failure: Optional[Callable[[Any], None]] = None) -> "ConnectionPool":
+        """并发打开所有连接，至少一个成功即可使用"""
+        connections = [PooledConnection(i, client, server_name, max_in_flight) for i in range(size)]
+        results = await asyncio.gather(*(conn.open(timeout) for conn in connections), return_exceptions=True)
+        opened = [conn for conn, result in zip(connections, results) if not isinstance(result, BaseException)]
+        for conn, result in zip(connections, results):
+            if isinstance(result, BaseException):
+                await conn.close()
+        if not opened:
+            raise RuntimeError(f"连接池打开失败: {results[0]}")
+        return cls(opened, dispatch, on_failure)
+
+    def tool_names(self) -> List[str]:
+        return sorted({name for conn in self.connections for name in conn.tools})
+
+    def _pick(self, tool_name: str) -> Optional[PooledConnection]:
+        candidates = [conn for conn in self.connections if conn.alive and tool_name in conn.tools]
+        if not candidates:
+            return None
+        if self.dispatch == "round_robin":
+            return candidates[next(self._round_robin) % len(candidates)]
+        # 在途请求最少者优先，相同时轮询打散
+        offset = next(self._round_robin)
+        return min(
+            (candidates[(offset + i) % len(candidates)] for i in range(len(candidates))),
+            key=lambda conn: conn.in_flight
+        )
+
+    async def invoke(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        conn = self._pick(tool_name)
+        if conn is None:
+            error = NoConnectionError(f"没有可用的MCP连接: {tool_name}")
+            if self.on_failure:
+                self.on_failure(error)
+            raise error
+        try:
+            return await conn.invoke(tool_name, arguments)
+        except Exception as e:
+            # 只上报连接类错误；高德返回的业务错误（ToolException 等）说明连接正常
+            from resilience import is_transient  # resilience 依赖本模块，延迟导入避免循环
+            if self.on_failure and is_transient(e):
+                self.on_failure(e)
+            raise
+
+    async def ping(self, timeout: float) -> bool:
+        """探测所有连接，全部正常才视为健康"""
+        results = await asyncio.gather(*(conn.ping(timeout) for conn in self.connections), return_exceptions=True)
+        return not any(isinstance(result, BaseException) for result in results)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(conn.in_flight for conn in self.connections)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [conn.stats() for conn in self.connections]
+
+    async def close(self, drain_timeout: float = 0):
+        """关闭所有连接；drain_timeout 内等待在途请求完成"""
+        deadline = time.monotonic() + drain_timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        await asyncio.gather(*(conn.close() for conn in self.connections))
+
+
+class PooledTool:
+    """与 MCP 工具接口一致的包装，调用时由连接池选择连接"""
+
+    def __init__(self, name: str, pool: ConnectionPool):
+        self.name = name
+        self.pool = pool
+
+    async def ainvoke(self, arguments: Dict[str, Any]) -> Any:
+        return await self.pool.invoke(self.name, arguments)
+
+
+class ToolRegistry:
+    """可自愈的 MCP 工具注册表
+
+    - 工具按名称存放在字典中，查找为 O(1)
+    - 后台任务定期探测连接，失败后以指数退避重连
+    - 重连成功后整体替换工具字典，正在进行的请求不受影响
+    - pool_size > 0 时维护常驻会话连接池；为 0 时每次调用新建会话
+    """
+
+    def __init__(self, connections: Dict[str, Dict[str, Any]], probe_interval: float = 60,
+                 probe_timeout: float = 10, min_backoff: float = 1, max_backoff: float = 60,
+                 pool_size: int = 0, max_in_flight: int = 8, dispatch: str = "least_loaded",
+                 min_probe_interval: float = 5):
+        self.connections = connections
+        self.server_name = next(iter(connections))
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.dispatch = dispatch
+        self.pool: Optional[ConnectionPool] = None
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        # 调用失败触发的立即健康检查之间的最小间隔（秒），避免失败集中时反复探测
+        self.min_probe_interval = min_probe_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.client: Optional[MultiServerMCPClient] = None
+        self.tools: Dict[str, Any] = {}
+        self.healthy = False
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.last_probe_at: Optional[float] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_wakeup = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """首次连接并启动后台健康检查；首次连接失败时由后台任务继续重试"""
+        self._wakeup = asyncio.Event()
+        try:
+            await self.connect()
+        except Exception as e:
+            self._mark_unhealthy(e)
+            logger.error(f"❌ MCP客户端初始化失败，将在后台重试: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def connect(self):
+        """建立新连接并加载工具，成功后原子替换工具集"""
+        client = MultiServerMCPClient(self.connections)
+        pool = None
+        if self.pool_size > 0:
+            pool = await ConnectionPool.open(
+                client, self.server_name, self.pool_size, self.max_in_flight,
+                timeout=self.probe_timeout, dispatch=self.dispatch, on_failure=self.report_failure
+            )
+            tools = {name: PooledTool(name, pool) for name in pool.tool_names()}
+        else:
+            tools = {tool.name: tool for tool in await asyncio.wait_for(client.get_tools(), timeout=self.probe_timeout)}
+        if not tools:
+            if pool:
+                await pool.close()
+            raise RuntimeError("未加载到任何工具")
+        
+        old_pool = self.pool
+        self.client = client
+        self.pool = pool
+        self.tools = tools
+        self.healthy = True
+        if old_pool:
+            # 旧连接池等在途请求完成后再关闭
+            asyncio.create_task(old_pool.close(drain_timeout=30))
+        self.last_error = None
+        logger.info(f"✅ 成功加载 {len(self.tools)} 个高德地图工具")
+
+    async def probe(self) -> bool:
+        """探测当前连接是否可用"""
+        self.last_probe_at = time.time()
+        if not self.client:
+            return False
+        try:
+            if self.pool:
+                if not await self.pool.ping(self.probe_timeout):
+                    raise RuntimeError("连接池中存在不可用的连接")
+                return True
+            tools = await asyncio.wait_for(self.client.get_tools(), timeout=self.probe_timeout)
+            return bool(tools)
+        except Exception as e:
+            self._mark_unhealthy(e)
+            logger.warning(f"⚠️ MCP健康检查失败: {e}")
+            return False
+
+    def get(self, tool_name: str) -> Optional[Any]:
+        """按名称获取工具；工具不可用时唤醒后台任务尽快重连"""
+        tool = self.tools.get(tool_name)
+        if tool is None:
+            self.report_failure(f"工具不可用: {tool_name}")
+        return tool
+
+    def report_failure(self, error: Any):
+        """上报连接类失败，触发一次立即健康检查；距上次触发不足 min_probe_interval 秒时只记录错误"""
+        self.last_error = str(error)
+        now = time.monotonic()
+        if self._wakeup and now - self._last_wakeup >= self.min_probe_interval:
+            self._last_wakeup = now
+            self._wakeup.set()
+
+    def _mark_unhealthy(self, error: Any):
+        self.healthy = False
+        self.last_error = str(error)
+
+    async def _run(self):
+        """后台循环：健康时定期探测，不健康时指数退避重连"""
+        backoff = self.min_backoff
+        while True:
+            if self.healthy:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.probe_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.probe()
+                continue
+
+            try:
+                await self.connect()
+                self.reconnects += 1
+                backoff = self.min_backoff
+                logger.info(f"🔁 MCP连接已恢复 (第{self.reconnects}次重连)")
+            except Exception as e:
+                self._mark_unhealthy(e)
+                delay = backoff * (0.5 + random.random())
+                logger.warning(f"⚠️ MCP重连失败，{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "tools": sorted(self.tools),
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "last_probe_at": self.last_probe_at,
+            "pool": self.pool.stats() if self.pool else [],
+        }
+
+    async def close(self):
+        """停止后台任务并释放工具"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+        self.tools = {}
+        self.client = None
+        self.healthy = False
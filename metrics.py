@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+运行指标
+进程内的计数器、仪表和直方图，以 Prometheus 文本格式导出；
+记录只做字典查找和数值累加，不加锁、不分配对象，热路径开销可以忽略
+"""
+
+import functools
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认直方图分桶（秒），覆盖缓存命中的毫秒级到LLM调用的数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """指标基类，标签值按位置传入"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """可增可减的仪表；传入 callback 时在导出时取值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                self._values[()] = float(self.callback())
+            except Exception:
+                return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """按固定分桶统计耗时分布"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., +Inf 桶计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return int(sum(state[:-1])) if state else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(round(state[-1], 6))}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序导出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "route_stage_duration_seconds", "路径规划各步骤耗时", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "route_stage_errors_total", "路径规划各步骤失败次数", ("stage",))
+TOOL_LATENCY = REGISTRY.histogram(
+    "mcp_tool_duration_seconds", "MCP工具调用耗时", ("tool",))
+TOOL_ERRORS = REGISTRY.counter(
+    "mcp_tool_errors_total", "MCP工具调用异常次数", ("tool",))
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "LLM调用耗时（不含缓存命中）", ("stage",))
+LLM_ERRORS = REGISTRY.counter(
+    "llm_request_errors_total", "LLM调用异常次数", ("stage",))
+TOOL_RETRIES = REGISTRY.counter(
+    "mcp_tool_retries_total", "MCP工具调用重试次数", ("tool",))
+TOOL_HEDGES = REGISTRY.counter(
+    "mcp_tool_hedges_total", "MCP工具对冲请求次数", ("tool",))
+TOOL_SHORT_CIRCUITS = REGISTRY.counter(
+    "mcp_tool_short_circuits_total", "熔断期间被直接拒绝的MCP工具调用次数", ("tool",))
+CIRCUIT_STATE = REGISTRY.gauge(
+    "mcp_tool_circuit_state", "MCP工具熔断器状态（0 关闭, 1 半开, 2 打开）", ("tool",))
+COALESCED_CALLS = REGISTRY.counter(
+    "singleflight_coalesced_total", "与进行中的相同调用合并、未单独请求上游的次数", ("kind", "name"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP请求耗时", ("method", "path", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数")
+REQUESTS_CANCELLED = REGISTRY.counter(
+    "http_requests_cancelled_total", "因超出时间预算或客户端断开而取消的请求数", ("path", "reason"))
+
+
+def observe_stage(stage: str, failed: Optional[Callable[[object], bool]] = None):
+    """记录异步步骤耗时的装饰器；抛出异常或 failed(返回值) 为真时计为该步骤失败"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                STAGE_ERRORS.inc(stage)
+                raise
+            finally:
+                STAGE_LATENCY.observe(time.perf_counter() - start, stage)
+            if failed is not None and failed(result):
+                STAGE_ERRORS.inc(stage)
+            return result
+        return wrapper
+    return decorator
+
+
+class ObservedTool:
+    """记录调用耗时和异常次数的 MCP 工具包装"""
+
+    __slots__ = ("tool", "name")
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+
+    async def ainvoke(self, arguments, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.tool.ainvoke(arguments, **kwargs)
+        except Exception:
+            TOOL_ERRORS.inc(self.name)
+            raise
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - start, self.name)
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：统计在途请求数和按路由模板分组的请求耗时"""
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # 使用路由模板而非实际路径，避免 /session/{id} 之类的路径造成标签爆炸
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, scope["method"], path, status)
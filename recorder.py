@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+流量录制
+按需开启的 ASGI 中间件，把 /route 和 /session 请求（含会话ID、请求体、时间和耗时）
+逐行写入 JSONL 文件，供 bench/replay.py 按原始节奏回放
+"""
+
+import json
+import os
+import time
+from typing import Optional, Sequence
+from urllib.parse import unquote
+
+from log_setup import JSONLWriter
+
+# 录制文件路径，留空则不录制；可包含 {pid} 占位符
+TRAFFIC_RECORD_FILE = os.getenv("TRAFFIC_RECORD_FILE", "")
+# 录制的路径前缀
+TRAFFIC_RECORD_PATHS = tuple(
+    path for path in os.getenv("TRAFFIC_RECORD_PATHS", "/route,/session").split(",") if path
+)
+# 请求体超过该大小时不录制请求体（字节）
+TRAFFIC_RECORD_MAX_BODY = int(os.getenv("TRAFFIC_RECORD_MAX_BODY", "65536"))
+
+
+def _session_id(path: str, body: Optional[dict]) -> Optional[str]:
+    """从请求体或 /session/{id} 路径中取会话ID"""
+    if isinstance(body, dict) and body.get("session_id"):
+        return body["session_id"]
+    if path.startswith("/session/"):
+        return unquote(path[len("/session/"):])
+    return None
+
+
+class TrafficRecorderMiddleware:
+    """ASGI 中间件：录制匹配路径的请求，写入在后台线程完成"""
+
+    def __init__(self, app, path: str, prefixes: Sequence[str] = TRAFFIC_RECORD_PATHS,
+                 max_body: int = TRAFFIC_RECORD_MAX_BODY):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.max_body = max_body
+        self.writer = JSONLWriter(path, name="traffic-recorder")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        size = 0
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= self.max_body:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            body = None
+            if chunks and size <= self.max_body:
+                try:
+                    body = json.loads(b"".join(chunks))
+                except ValueError:
+                    body = None
+            self.writer.write({
+                "ts": round(started_at, 3),
+                "method": scope["method"],
+                "path": scope["path"],
+                "session_id": _session_id(scope["path"], body),
+                "body": body,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+MCP 工具调用的容错策略
+- 每个工具独立的单次调用超时
+- 对冲请求：调用超过近期 p95 延迟仍未返回时，再并发发起一次，取先返回的结果
+- 瞬时错误（超时、连接异常）带抖动的指数退避重试；工具返回的业务错误（参数错误、地址无法解析、配额等）不重试
+- 重试和对冲共用一个按调用量积累的预算，避免上游故障时放大流量
+- 每个工具独立的熔断器：连续多次调用以瞬时错误告终后在冷却期内直接失败，冷却结束后放行一次试探调用
+高德地图 MCP 工具均为只读查询，重复调用没有副作用
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import anyio
+import httpx
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from deadline import DeadlineExceeded, remaining
+from mcp_registry import NoConnectionError
+from metrics import CIRCUIT_STATE, TOOL_HEDGES, TOOL_RETRIES, TOOL_SHORT_CIRCUITS
+from tracing import current_span, set_attribute
+
+logger = logging.getLogger(__name__)
+
+# 可以重试、计入熔断的瞬时错误：超时和传输层异常
+# 工具返回的错误（ToolException）来自高德业务本身，重试结果相同，且说明上游可达
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError, ConnectionError, httpx.TransportError,
+    anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, NoConnectionError,
+)
+# McpError 中只有等待响应超时和连接关闭属于瞬时错误，其余为服务端返回的 JSON-RPC 错误
+TRANSIENT_MCP_CODES = (CONNECTION_CLOSED, httpx.codes.REQUEST_TIMEOUT)
+
+
+def is_transient(error: BaseException) -> bool:
+    # 请求自身的时间预算用完时重试没有意义
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, McpError):
+        return error.error.code in TRANSIENT_MCP_CODES
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开；冷却 reset_timeout 秒后半开，放行一次试探调用决定关闭或再次打开"""
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"🔌 MCP工具 {self.name} 熔断器: {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.set(self._STATE_VALUES[state], self.name)
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def release(self):
+        """调用被取消，没有得出结论时释放试探名额"""
+        self._probing = False
+
+
+class RetryBudget:
+    """额外请求（重试和对冲）的令牌桶：每次调用积累 ratio 个令牌，每次额外请求消耗 1 个"""
+
+    def __init__(self, ratio: float = 0.1, capacity: float = 10):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ResiliencePolicy:
+    """容错参数"""
+
+    def __init__(self, timeout: float = 10, timeouts: Optional[Dict[str, float]] = None, retries: int = 2,
+                 retry_base_delay: float = 0.1, retry_max_delay: float = 2, hedge: bool = True,
+                 hedge_percentile: float = 95, hedge_min_delay: float = 0.05, hedge_min_samples: int = 20,
+                 budget_ratio: float = 0.1, budget_capacity: float = 10,
+                 breaker_failures: int = 5, breaker_reset: float = 30):
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.budget_ratio = budget_ratio
+        self.budget_capacity = budget_capacity
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """根据环境变量创建；MCP_TOOL_TIMEOUTS 形如 "maps_geo=5,maps_direction_transit_integrated=15" """
+        timeouts = {}
+        for item in os.getenv("MCP_TOOL_TIMEOUTS", "").split(","):
+            name, _, value = item.partition("=")
+            if name.strip() and value.strip():
+                timeouts[name.strip()] = float(value)
+        return cls(
+            timeout=float(os.getenv("MCP_TOOL_TIMEOUT", "10")),
+            timeouts=timeouts,
+            retries=int(os.getenv("MCP_RETRIES", "2")),
+            retry_base_delay=float(os.getenv("MCP_RETRY_BASE_DELAY", "0.1")),
+            retry_max_delay=float(os.getenv("MCP_RETRY_MAX_DELAY", "2")),
+            hedge=os.getenv("MCP_HEDGE", "1") == "1",
+            hedge_percentile=float(os.getenv("MCP_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("MCP_HEDGE_MIN_DELAY", "0.05")),
+            hedge_min_samples=int(os.getenv("MCP_HEDGE_MIN_SAMPLES", "20")),
+            budget_ratio=float(os.getenv("MCP_RETRY_BUDGET_RATIO", "0.1")),
+            breaker_failures=int(os.getenv("MCP_BREAKER_FAILURES", "5")),
+            breaker_reset=float(os.getenv("MCP_BREAKER_RESET", "30")),
+        )
+
+
+class ToolGuard:
+    """单个工具的容错状态：近期延迟、重试预算和熔断器"""
+
+    def __init__(self, name: str, policy: ResiliencePolicy):
+        self.name = name
+        self.policy = policy
+        self.timeout = policy.timeouts.get(name, policy.timeout)
+        self.breaker = CircuitBreaker(name, policy.breaker_failures, policy.breaker_reset)
+        self.budget = RetryBudget(policy.budget_ratio, policy.budget_capacity)
+        self.latencies: deque = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuits = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """近期成功调用延迟的分位数；样本不足或熔断器未关闭时不对冲"""
+        if not self.policy.hedge or len(self.latencies) < self.policy.hedge_min_samples:
+            return None
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.policy.hedge_percentile / 100))
+        delay = max(self.policy.hedge_min_delay, latencies[index])
+        return delay if delay < self.timeout else None
+
+    def backoff(self, attempt: int) -> float:
+        """全抖动指数退避"""
+        return random.uniform(0, min(self.policy.retry_max_delay, self.policy.retry_base_delay * 2 ** attempt))
+
+    async def _attempt(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        result = await asyncio.wait_for(call(), self.timeout)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """一次调用；超过对冲延迟仍未返回时再发起一次，取先成功的结果"""
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._attempt(call)
+
+        primary = asyncio.ensure_future(self._attempt(call))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            if not self.budget.withdraw():
+                return await primary
+            self.hedges += 1
+            TOOL_HEDGES.inc(self.name)
+            set_attribute("hedged", True)
+            pending.add(asyncio.ensure_future(self._attempt(call)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            self.short_circuits += 1
+            TOOL_SHORT_CIRCUITS.inc(self.name)
+            set_attribute("circuit_open", True)
+            raise CircuitOpenError(f"MCP工具 {self.name} 熔断中，暂时不可用")
+
+        self.calls += 1
+        self.budget.deposit()
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                try:
+                    result = await self._hedged(call)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if not is_transient(e):
+                        # 业务错误说明上游可达：不重试，也不计入熔断
+                        self.breaker.record_success()
+                        settled = True
+                        raise
+                    delay = self.backoff(attempt)
+                    left = remaining()
+                    if (attempt >= self.policy.retries or self.breaker.state != CircuitBreaker.CLOSED
+                            or (left is not None and left <= delay) or not self.budget.withdraw()):
+                        # 每次调用（含重试）最多计一次失败
+                        self.breaker.record_failure()
+                        settled = True
+                        raise
+                    attempt += 1
+                    self.retries += 1
+                    TOOL_RETRIES.inc(self.name)
+                    span = current_span()
+                    if span is not None:
+                        span.increment("retry_count")
+                    logger.info(f"🔁 MCP工具 {self.name} 第{attempt}次重试（{delay * 1000:.0f}ms后）: {type(e).__name__}: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                settled = True
+                return result
+        finally:
+            if not settled:
+                self.breaker.release()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "short_circuits": self.short_circuits,
+            "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else None,
+        }
+
+
+class ResilientTool:
+    """与 MCP 工具接口一致的包装，调用经过对应工具的 ToolGuard"""
+
+    __slots__ = ("tool", "name", "guard")
+
+    def __init__(self, tool, guard: ToolGuard):
+        self.tool = tool
+        self.name = tool.name
+        self.guard = guard
+
+    async def ainvoke(self, arguments, **kwargs):
+        return await self.guard.call(lambda: self.tool.ainvoke(arguments, **kwargs))
+
+
+class Resilience:
+    """按工具名称维护 ToolGuard，跨请求共享延迟统计和熔断状态"""
+
+    def __init__(self, policy: Optional[ResiliencePolicy] = None):
+        self.policy = policy or ResiliencePolicy()
+        self.guards: Dict[str, ToolGuard] = {}
+
+    @classmethod
+    def from_env(cls) -> "Resilience":
+        return cls(ResiliencePolicy.from_env())
+
+    def wrap(self, tool) -> ResilientTool:
+        guard = self.guards.get(tool.name)
+        if guard is None:
+            guard = self.guards[tool.name] = ToolGuard(tool.name, self.policy)
+        return ResilientTool(tool, guard)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: guard.stats() for name, guard in sorted(self.guards.items())}
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+响应编码
+按请求的 Accept 头选择 JSON（orjson）或 MessagePack 编码，客户端只接受无法提供的格式时返回 406；
+响应体超过阈值且客户端支持时使用 gzip 压缩
+"""
+
+import gzip
+import json
+import os
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # 未安装时回退到标准库 json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # requirements.txt 已包含；未安装时只提供 JSON
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# 响应体达到该大小（字节）时才压缩，过小的响应压缩收益不抵开销
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+# gzip 压缩级别（1~9），级别越高越慢
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept / Accept-Encoding 头，返回 {取值: q}"""
+    accepted = {}
+    for item in (header or "").split(","):
+        value, _, params = item.partition(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, number = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        accepted[value] = q
+    return accepted
+
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """客户端明确偏好 MessagePack 且已安装 msgpack 时使用，否则使用 JSON；
+    客户端只接受 MessagePack 而 msgpack 未安装时返回 None（应响应 406）"""
+    accepted = _accepted(accept)
+    msgpack_q = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_q = max(accepted.get(JSON_MEDIA_TYPE, 0.0), accepted.get("application/*", 0.0), accepted.get("*/*", 0.0))
+    if msgpack_q > 0 and msgpack_q >= json_q:
+        if msgpack is not None:
+            return MSGPACK_MEDIA_TYPES[0]
+        if json_q == 0:
+            return None
+    return JSON_MEDIA_TYPE
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    accepted = _accepted(accept_encoding)
+    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
+
+
+def dumps(payload: Any, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return msgpack.packb(payload, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_response(payload: Any, media_type: str = JSON_MEDIA_TYPE, accept_encoding: Optional[str] = None,
+                    status_code: int = 200) -> Response:
+    """按协商得到的 media_type 编码响应体，必要时 gzip 压缩"""
+    body = dumps(payload, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= RESPONSE_GZIP_MIN_BYTES and accepts_gzip(accept_encoding):
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type=media_type, headers=headers)
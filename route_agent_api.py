@@ -8,67 +8,95 @@ import asyncio
 import os
 import json
 import logging
-import logging.handlers
-from typing import Optional, Dict, List, Tuple
-from fastapi import FastAPI, HTTPException
+import time
+from typing import Annotated, Awaitable, Callable, Optional, Dict, List, Literal, Tuple
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, StringConstraints
+from sse_starlette.sse import EventSourceResponse
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from dotenv import load_dotenv
 
-# 配置日志 - 同时输出到文件和控制台
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# 创建formatter
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-
-# 文件处理器
-file_handler = logging.handlers.RotatingFileHandler(
-    'route_agent.log', 
-    maxBytes=10*1024*1024,  # 10MB
-    backupCount=5,
-    encoding='utf-8'  # 明确指定编码
-)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-
-# 控制台处理器
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
-
-# 在Windows下处理控制台编码问题
-import sys
-if sys.platform.startswith('win'):
-    try:
-        # 尝试设置控制台为UTF-8
-        import codecs
-        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'ignore')
-        sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'ignore')
-    except:
-        # 如果设置失败，就使用错误忽略模式
-        console_handler.stream.errors = 'ignore'
-
-# 添加处理器
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# 先加载 .env，组件模块在导入时读取各自的配置（LOG_*、TRACE_*、CACHE_* 等）
+load_dotenv()
 
-# 防止重复日志
-logger.propagate = False
+from cache import DivisionIndex, GeocodeCache, LLMResponseCache, RouteCache, normalize_text
+from deadline import DeadlineMiddleware, DeadlineTool, call_with_deadline, deadline_scope
+from geo_distance import DistanceMatrix, estimate_distance, is_lnglat
+from intent_rules import IntentRuleParser
+from log_setup import log_body, setup_logging
+from metrics import (LLM_ERRORS, LLM_LATENCY, REGISTRY, STAGE_ERRORS, MetricsMiddleware,
+                     ObservedTool, observe_stage)
+from recorder import TRAFFIC_RECORD_FILE, TrafficRecorderMiddleware
+from resilience import Resilience
+from response_codec import encode_response, negotiate_media_type
+from route_model import Route, duration_minutes
+from singleflight import CoalescedTool, SingleFlight
+from tracing import TraceIdFilter, TracedTool, TracingMiddleware, set_attribute, start_span, traced
+from mcp_registry import ToolRegistry
+from session_store import create_session_store
+
+# 输出到同一日志文件和控制台的 logger（本模块和各组件模块）
+LOGGER_NAMES = (__name__, "mcp_registry", "deadline", "resilience", "cache")
+
+# 配置日志 - 经后台线程输出到文件和控制台
+logger = logging.getLogger(__name__)
+setup_logging(LOGGER_NAMES)
+# 日志记录附带当前请求的 trace ID
+for _name in LOGGER_NAMES:
+    logging.getLogger(_name).addFilter(TraceIdFilter())
 
-load_dotenv()
 amap_api_key = os.getenv("AMAP_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
 if not amap_api_key or not openai_api_key:
     raise ValueError("请在 .env 文件中设置 AMAP_API_KEY 和 OPENAI_API_KEY 环境变量")
 
+# 高德地图 MCP 服务地址（基准测试等场景可指向本地模拟服务）
+AMAP_MCP_URL = os.getenv("AMAP_MCP_URL") or f"https://mcp.amap.com/sse?key={amap_api_key}"
+
+# RouteRequest.format 中需要返回结构化路线的取值
+STRUCTURED_FORMATS = ("structured", "both")
+
+# 步行/公共交通的距离分界（米）
+WALKING_DISTANCE_THRESHOLD = 1000
+# 起终点所在城市均未知时，公共交通规划使用的城市
+TRANSIT_DEFAULT_CITY = os.getenv("TRANSIT_DEFAULT_CITY", "深圳")
+# 调试模式：路线结果保留高德原始响应
+ROUTE_DEBUG = os.getenv("ROUTE_DEBUG", "0") == "1"
+# 本地估算距离与分界相差在此范围内时，调用远程距离工具确认（米）
+DISTANCE_REFINE_MARGIN = int(os.getenv("DISTANCE_REFINE_MARGIN", "300"))
+# 是否允许在临界距离时调用远程距离工具
+DISTANCE_REMOTE_REFINE = os.getenv("DISTANCE_REMOTE_REFINE", "1") == "1"
+
+# 快速模式：一次LLM调用同时完成意图识别、城市推断和地址格式化
+FAST_PATH_ENABLED = os.getenv("ROUTE_FAST_PATH", "0") == "1"
+
+# 等待用户确认城市时，预先对候选城市中的地点做地理编码
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+# 参与预取的候选城市数量上限
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+# 所有会话共享的预取并发上限
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+
+# 批量规划单次请求的最大起终点对数量
+BATCH_MAX_PAIRS = int(os.getenv("BATCH_MAX_PAIRS", "5000"))
+# 批量规划的最大并发数
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+
+# 距离工具单次请求支持的起点数量上限（高德距离测量API限制）
+DISTANCE_MAX_ORIGINS = 100
+# 距离矩阵单次请求的最大单元数（起点数 × 终点数）
+MATRIX_MAX_CELLS = int(os.getenv("MATRIX_MAX_CELLS", "20000"))
+
 # FastAPI 应用
 app = FastAPI(title="路径规划智能体 API", version="1.0.0")
 
+# 请求时间预算：超时或客户端断开时取消处理（先注册的中间件在内层，504 响应同样经过跨域处理）
+app.add_middleware(DeadlineMiddleware)
+
 # 允许跨域
 app.add_middleware(
     CORSMiddleware,
@@ -76,44 +104,151 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# 请求耗时与在途请求数统计
+app.add_middleware(MetricsMiddleware)
+
+# 请求链路追踪，响应头 X-Trace-Id 返回本次请求的 trace ID
+app.add_middleware(TracingMiddleware)
+
+# 流量录制（设置 TRAFFIC_RECORD_FILE 后开启），录制文件可用 bench/replay.py 回放
+if TRAFFIC_RECORD_FILE:
+    app.add_middleware(TrafficRecorderMiddleware, path=TRAFFIC_RECORD_FILE)
+
 # 请求模型
 class RouteRequest(BaseModel):
     user_input: str
     session_id: Optional[str] = None
+    format: Literal["markdown", "structured", "both"] = "markdown"  # markdown: 仅文本, structured: 仅结构化路线（不生成文本）, both: 两者都返回
 
 class CityConfirmation(BaseModel):
     session_id: str
     city_input: str
 
+# 去除首尾空白后不能为空的地址或坐标
+Endpoint = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+class DistanceMatrixRequest(BaseModel):
+    origins: List[Endpoint] = Field(min_length=1)  # 完整地址或 "经度,纬度"
+    destinations: List[Endpoint] = Field(min_length=1)
+    type: Literal["0", "1", "3"] = "1"  # 0: 直线距离, 1: 驾车距离, 3: 步行距离
+    concurrency: int = 8
+
 # 响应模型
 class RouteResponse(BaseModel):
     success: bool
     message: str
     need_city_confirmation: bool = False
     session_id: Optional[str] = None
+    route: Optional[Dict] = None  # 结构化路线，仅 format 为 structured/both 时返回
+
+# 批量规划模型
+class BatchRoutePair(BaseModel):
+    origin: Endpoint  # 完整地址（如"深圳市深圳北站"）或 "经度,纬度"
+    destination: Endpoint
+    id: Optional[str] = None
+
+class BatchRouteRequest(BaseModel):
+    pairs: List[BatchRoutePair]
+    concurrency: int = 8
+
+class BatchRouteResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    success: bool
+    origin_coords: Optional[str] = None
+    destination_coords: Optional[str] = None
+    distance: Optional[int] = None
+    route: Optional[Dict] = None
+    error: Optional[str] = None
+    elapsed_ms: float = 0
+
+class BatchRouteResponse(BaseModel):
+    results: List[BatchRouteResult]
+    total: int
+    succeeded: int
+    failed: int
+    unique_addresses: int
+    geocode_ms: float
+    planning_ms: float
+    total_ms: float
+
+# 阶段进度回调：(阶段名, 阶段数据)
+ProgressCallback = Callable[[str, Dict], Awaitable[None]]
+
+async def notify_progress(emit: Optional[ProgressCallback], stage: str, data: Optional[Dict] = None):
+    """通知阶段完成（流式接口使用，普通接口 emit 为 None）"""
+    if emit:
+        await emit(stage, data or {})
 
 # 全局智能体实例
 route_agent = None
 
-# 新增会话状态管理
-session_store = {}
+# 各会话正在进行的预取任务
+prefetch_tasks: Dict[str, asyncio.Task] = {}
 
 class SessionData(BaseModel):
     locations: List[str] = []
     intent_result: Dict = {}
     city_analysis: Dict = {}
     stage: str = "start"  # start, waiting_city, processing
+    recent_cities: List[str] = []  # 最近规划成功的城市，最新的在前
+    prefetched: Dict[str, str] = {}  # 预取的地理编码结果：规范化地址 -> 坐标
+
+# 会话状态管理：空闲过期、容量上限，sqlite 后端可供多个 worker 共享
+session_store = create_session_store(
+    SessionData,
+    backend=os.getenv("SESSION_BACKEND", "memory"),
+    path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+    ttl=float(os.getenv("SESSION_TTL", "1800")),
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "10000")),
+)
+
+# 导出时取值的运行指标
+REGISTRY.gauge("route_sessions", "当前会话数", callback=lambda: len(session_store))
+REGISTRY.gauge("mcp_healthy", "MCP连接是否健康（1/0）",
+               callback=lambda: float(bool(route_agent and route_agent.tool_registry.healthy)))
+REGISTRY.gauge("mcp_pool_in_flight", "MCP连接池在途调用数",
+               callback=lambda: route_agent.tool_registry.pool.in_flight if route_agent and route_agent.tool_registry.pool else 0)
 
 class SimpleRouteAgent:
-    """简单路径规划智能体"""
+    """简单路径规划智能体
+    
+    llm 可传入任何提供 ainvoke(messages) 的对话模型，默认使用 ChatOpenAI；
+    mcp_url 默认为 AMAP_MCP_URL
+    """
     
-    def __init__(self):
-        self.amap_client = None
-        self.amap_tools = None
-        self.llm = None
-        self._initialize_llm()
+    def __init__(self, llm=None, mcp_url: Optional[str] = None):
+        self.tool_registry = ToolRegistry(
+            {
+                "amap": {
+                    "url": mcp_url or AMAP_MCP_URL,
+                    "transport": "sse",
+                }
+            },
+            probe_interval=float(os.getenv("MCP_PROBE_INTERVAL", "60")),
+            probe_timeout=float(os.getenv("MCP_PROBE_TIMEOUT", "10")),
+            max_backoff=float(os.getenv("MCP_MAX_BACKOFF", "60")),
+            pool_size=int(os.getenv("MCP_POOL_SIZE", "4")),
+            max_in_flight=int(os.getenv("MCP_POOL_MAX_IN_FLIGHT", "8")),
+            dispatch=os.getenv("MCP_POOL_DISPATCH", "least_loaded"),
+            min_probe_interval=float(os.getenv("MCP_MIN_PROBE_INTERVAL", "5")),
+        )
+        self.resilience = Resilience.from_env()
+        # 合并进行中的相同MCP调用和LLM调用
+        self.tool_flight = SingleFlight("mcp")
+        self.llm_flight = SingleFlight("llm")
+        self.llm = llm
+        self.geocode_cache = GeocodeCache.from_env()
+        self.division_index = DivisionIndex.from_env()
+        self.route_cache = RouteCache.from_env()
+        self.llm_cache = LLMResponseCache.from_env()
+        self.intent_parser = IntentRuleParser()
+        self.prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        if self.llm is None:
+            self._initialize_llm()
         
     def _initialize_llm(self):
         """初始化语言模型"""
@@ -129,32 +264,73 @@ class SimpleRouteAgent:
             logger.error(f"❌ LLM初始化失败: {e}")
             
     async def initialize(self):
-        """初始化MCP客户端"""
+        """初始化MCP客户端（失败时由注册表在后台持续重连）"""
         logger.info("🚀 初始化高德地图MCP客户端...")
-        
-        try:
-            self.amap_client = MultiServerMCPClient({
-                "amap": {
-                    "url": f"https://mcp.amap.com/sse?key={amap_api_key}",
-                    "transport": "sse",
-                }
-            })
-            self.amap_tools = await self.amap_client.get_tools()
-            logger.info(f"✅ 成功加载 {len(self.amap_tools)} 个高德地图工具")
-        except Exception as e:
-            logger.error(f"❌ MCP客户端初始化失败: {e}")
-            self.amap_tools = []
+        await self.tool_registry.start()
+
+    async def warm_up(self, timeout: float):
+        """预热：等待MCP工具加载完成（最多 timeout 秒），worker 在此之后才开始接收请求"""
+        deadline = time.monotonic() + timeout
+        while not self.tool_registry.tools and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        if self.tool_registry.tools:
+            logger.info(f"🔥 worker {os.getpid()} 预热完成，已加载 {len(self.tool_registry.tools)} 个工具")
+        else:
+            logger.warning(f"⚠️ worker {os.getpid()} 预热超时，MCP工具仍在后台重连")
         
     def get_tool(self, tool_name: str):
-        """获取指定工具"""
-        if not self.amap_tools:
+        """获取指定工具
+
+        每次调用记录追踪 span；参数相同的进行中调用合并为一次（见 singleflight.py），
+        经过超时、对冲、重试和熔断处理（见 resilience.py），每次实际请求的耗时计入 /metrics
+        """
+        tool = self.tool_registry.get(tool_name)
+        if tool is None:
             return None
-        return next((tool for tool in self.amap_tools if tool.name == tool_name), None)
+        return TracedTool(CoalescedTool(self.resilience.wrap(ObservedTool(DeadlineTool(tool))), self.tool_flight))
 
+    async def _call_llm(self, stage: str, messages: List):
+        """调用LLM并记录耗时，以请求剩余时间预算为超时"""
+        start = time.perf_counter()
+        try:
+            with start_span("llm.ainvoke", stage=stage):
+                return await call_with_deadline(self.llm.ainvoke(messages))
+        except Exception:
+            LLM_ERRORS.inc(stage)
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - start, stage)
+
+    async def _invoke_llm(self, stage: str, messages: List) -> str:
+        """调用LLM并返回响应内容，相同阶段、相同（规范化后）提示词的结果直接取缓存"""
+        prompt = "\n".join(message.content for message in messages)
+        cached = self.llm_cache.get(stage, prompt)
+        set_attribute("llm_cache_hit", cached is not None)
+        if cached is not None:
+            logger.info(f"⚡ [{stage}] LLM缓存命中")
+            return cached
+        
+        # 相同阶段、相同提示词的进行中调用共享同一次LLM请求
+        response = await self.llm_flight.do((stage, prompt), lambda: self._call_llm(stage, messages), stage)
+        self.llm_cache.set(stage, prompt, response.content)
+        return response.content
+
+    def _discard_llm_cache(self, stage: str, messages: List):
+        """丢弃无法使用的LLM响应缓存"""
+        self.llm_cache.discard(stage, "\n".join(message.content for message in messages))
+
+    @traced("step1_identify_intent", stage="intent")
+    @observe_stage("intent")
     async def step1_identify_intent(self, user_input: str) -> Dict:
         """步骤1: LLM识别用户意图"""
         logger.info(f"🧠 步骤1: 识别用户意图")
         
+        # 固定句式直接用规则解析，无需调用LLM
+        rule_result = self.intent_parser.parse(user_input)
+        if rule_result:
+            logger.info("⚡ 规则意图识别命中: %s", rule_result)
+            return rule_result
+        
         system_prompt = """你是一个路径规划意图识别专家。你的任务是判断用户的意图类型。
 
 请分析用户输入，返回JSON格式：
@@ -187,20 +363,18 @@ class SimpleRouteAgent:
 
         try:
             # 记录发送给LLM的提示词
-            logger.info("📤 发送给LLM的提示词:")
-            logger.info(f"SystemMessage: {system_prompt}")
-            logger.info(f"HumanMessage: {user_message}")
+            log_body(logger, "📤 发送给LLM的提示词", "SystemMessage:", system_prompt,
+                     "HumanMessage:", user_message, stage="intent")
             
             messages = [
                 SystemMessage(content=system_prompt),
                 HumanMessage(content=user_message)
             ]
             
-            response = await self.llm.ainvoke(messages)
-            content = response.content.strip()
+            content = (await self._invoke_llm("intent", messages)).strip()
             
             # 记录LLM的响应
-            logger.info(f"📥 LLM原始响应: {content}")
+            log_body(logger, "📥 LLM原始响应", content, stage="intent")
             
             # 简单JSON提取
             if '{' in content:
@@ -211,16 +385,121 @@ class SimpleRouteAgent:
             
             result = json.loads(content)
             
-            logger.info(f"✅ 意图识别结果: {result}")
+            # 纠错依赖对话上下文，不走缓存
+            if result.get("intent_type") == "correction":
+                self._discard_llm_cache("intent", messages)
+            
+            logger.info("✅ 意图识别结果: %s", result)
             return result
             
         except Exception as e:
             logger.error(f"❌ 意图识别失败: {e}")
+            STAGE_ERRORS.inc("intent")
+            self._discard_llm_cache("intent", messages)
             return {"intent_type": "other", "reason": "识别过程出错"}
 
+    @traced("step1_fast_parse", stage="fast_parse")
+    @observe_stage("fast_parse", failed=lambda result: result is None)
+    async def step1_fast_parse(self, user_input: str) -> Optional[Dict]:
+        """快速模式: 一次LLM调用完成意图识别、城市推断和地址格式化
+        
+        返回与 step1_identify_intent 相同结构的结果；路径规划请求额外包含
+        addresses（补全城市后的两个地址）和 city_confidence（high/low）。
+        解析失败时返回 None，由调用方回退到逐步识别流程。
+        """
+        logger.info(f"⚡ 快速模式: 一次性解析用户输入")
+        
+        system_prompt = """你是一个路径规划助手。请一次性分析用户输入，返回JSON格式：
+
+1. 如果用户想要路径规划（从A到B），返回：
+{
+  "intent_type": "route_request",
+  "locations": ["地点A", "地点B"],
+  "addresses": ["城市市地点A", "城市市地点B"],
+  "city_confidence": "high",
+  "question": "",
+  "analysis": "你对这些地点所属城市的分析"
+}
+- locations 保持用户原始表述
+- addresses 将地点补全为"城市市+地点名"的格式
+- 只有当用户输入明确包含城市信息，或地点名称本身能唯一确定城市时，city_confidence 才为 "high"
+- 否则 city_confidence 为 "low"，addresses 留空列表，并在 question 中给出询问用户所在城市的问题
+- city_confidence 为 "low" 时，可额外返回 "candidate_cities": ["最可能的城市", ...]，按可能性从高到低最多3个城市名
+
+2. 如果用户在纠错或指出之前规划的错误，返回：
+{
+  "intent_type": "correction",
+  "correction_info": "用户的纠错内容",
+  "suggested_address": "用户建议的正确地址"
+}
+
+3. 如果都不是，返回：
+{
+  "intent_type": "other",
+  "reason": "说明原因"
+}
+
+注意：
+- 纠错通常包含"不对"、"错了"、"应该是"、"在XX区"等表述
+- 不确定城市时宁可选择 "low"，不要猜测
+- 只输出JSON，不要解释"""
+
+        user_message = f"用户输入：{user_input}"
+
+        try:
+            # 记录发送给LLM的提示词
+            log_body(logger, "📤 [快速模式] 发送给LLM的提示词", "SystemMessage:", system_prompt,
+                     "HumanMessage:", user_message, stage="fast_parse")
+            
+            messages = [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_message)
+            ]
+            
+            content = (await self._invoke_llm("fast_parse", messages)).strip()
+            
+            # 记录LLM的响应
+            log_body(logger, "📥 [快速模式] LLM原始响应", content, stage="fast_parse")
+            
+            # 简单JSON提取
+            if '{' in content:
+                import re
+                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                if json_match:
+                    content = json_match.group(0)
+            
+            result = json.loads(content)
+            if result.get("intent_type") not in ("route_request", "correction", "other"):
+                logger.warning("⚠️ 快速模式返回未知意图: %s", result)
+                self._discard_llm_cache("fast_parse", messages)
+                return None
+            
+            # 纠错依赖对话上下文，不走缓存
+            if result["intent_type"] == "correction":
+                self._discard_llm_cache("fast_parse", messages)
+            
+            if result["intent_type"] == "route_request":
+                addresses = result.get("addresses") or []
+                valid_addresses = len(addresses) == 2 and all(isinstance(a, str) and a.strip() for a in addresses)
+                if result.get("city_confidence") != "high" or not valid_addresses:
+                    result["city_confidence"] = "low"
+                    result["addresses"] = []
+                else:
+                    result["addresses"] = [a.strip() for a in addresses]
+            
+            logger.info("✅ 快速模式解析结果: %s", result)
+            return result
+            
+        except Exception as e:
+            logger.error(f"❌ 快速模式解析失败: {e}")
+            self._discard_llm_cache("fast_parse", messages)
+            return None
+
+    @traced("handle_correction", stage="correction")
+    @observe_stage("correction", failed=lambda result: result.startswith("❌"))
     async def handle_correction(self, correction_info: str, suggested_address: str) -> str:
         """处理用户纠错"""
-        logger.info(f"🔧 处理用户纠错: {correction_info}")
+        logger.info("🔧 处理用户纠错: %s", correction_info)
         
         # 让LLM从纠错信息中提取准确的地址
         extract_prompt = f"""用户指出了错误："{correction_info}"
@@ -237,23 +516,24 @@ class SimpleRouteAgent:
 
         try:
             # 记录发送给LLM的提示词
-            logger.info("📤 [纠错处理] 发送给LLM的提示词:")
-            logger.info(f"SystemMessage: {extract_prompt}")
+            log_body(logger, "📤 [纠错处理] 发送给LLM的提示词", "SystemMessage:", extract_prompt, stage="correction")
             
             messages = [
                 SystemMessage(content=extract_prompt)
             ]
             
-            response = await self.llm.ainvoke(messages)
+            response = await self._call_llm("correction", messages)
             corrected_address = response.content.strip()
             
             # 记录LLM的响应
-            logger.info(f"📥 [纠错处理] LLM原始响应: {corrected_address}")
-            logger.info(f"🎯 提取的纠正地址: {corrected_address}")
+            logger.info("🎯 提取的纠正地址: %s", corrected_address)
             
-            # 验证地址是否存在
+            # 验证地址是否存在（结果会写入地理编码缓存，供后续规划复用）
             coords = await self.step4_geocode(corrected_address)
             if coords:
+                # 用户原始表述也指向纠正后的位置
+                if suggested_address and suggested_address != corrected_address:
+                    self.geocode_cache.set(suggested_address, coords)
                 return f"✅ 找到了 {corrected_address} 的位置信息。如需重新规划路径，请告诉我起点和终点。"
             else:
                 return f"❌ 抱歉，无法找到 {corrected_address} 的位置信息，请提供更详细的地址。"
@@ -262,6 +542,8 @@ class SimpleRouteAgent:
             logger.error(f"❌ 纠错处理失败: {e}")
             return f"❌ 处理纠错时出现错误: {str(e)}"
 
+    @traced("step2_confirm_cities", stage="city")
+    @observe_stage("city")
     async def step2_confirm_cities(self, locations: List[str], original_user_input: str) -> Dict:
         """步骤2: 确认地点所属城市"""
         logger.info(f"🏙️ 步骤2: 确认城市信息")
@@ -282,41 +564,46 @@ class SimpleRouteAgent:
 {{
   "need_user_input": true,
   "question": "询问用户的具体问题",
-  "analysis": "你对这些地点的分析"
+  "analysis": "你对这些地点的分析",
+  "candidate_cities": ["最可能的城市", "其次可能的城市"]
 }}
 
 注意：
 - 优先从用户原始输入中识别城市信息
 - 如果地点名称已经包含城市/区域信息，就不要再询问
-- 只有在真正无法确定时才询问用户"""
+- 只有在真正无法确定时才询问用户
+- candidate_cities 按可能性从高到低列出最多3个城市名（如"深圳"），无法判断时返回空列表"""
 
         try:
             # 记录发送给LLM的提示词
-            logger.info("📤 [城市确认] 发送给LLM的提示词:")
-            logger.info(f"SystemMessage: {system_prompt}")
+            log_body(logger, "📤 [城市确认] 发送给LLM的提示词", "SystemMessage:", system_prompt, stage="city")
             
             messages = [
                 SystemMessage(content=system_prompt)
             ]
             
-            response = await self.llm.ainvoke(messages)
+            content = await self._invoke_llm("city", messages)
             
             # 记录LLM的响应
-            logger.info(f"📥 [城市确认] LLM原始响应: {response.content}")
+            log_body(logger, "📥 [城市确认] LLM原始响应", content, stage="city")
             
-            result = json.loads(response.content)
+            result = json.loads(content)
             
-            logger.info(f"✅ 城市确认分析: {result}")
+            logger.info("✅ 城市确认分析: %s", result)
             return result
             
         except Exception as e:
             logger.error(f"❌ 城市确认失败: {e}")
+            STAGE_ERRORS.inc("city")
+            self._discard_llm_cache("city", messages)
             return {
                 "need_user_input": True, 
                 "question": f"请告诉我'{locations[0]}'和'{locations[1]}'分别在哪个城市？",
                 "analysis": "无法分析地点归属"
             }
 
+    @traced("step4_parse_and_format_addresses", stage="format")
+    @observe_stage("format", failed=lambda result: not result)
     async def step4_parse_and_format_addresses(self, locations: List[str], user_city_input: str) -> List[str]:
         """步骤4: 解析用户输入并格式化地址"""
         logger.info(f"📍 步骤4: 解析并格式化地址")
@@ -338,36 +625,36 @@ class SimpleRouteAgent:
 
         try:
             # 记录发送给LLM的提示词
-            logger.info("📤 [地址格式化] 发送给LLM的提示词:")
-            logger.info(f"SystemMessage: {system_prompt}")
+            log_body(logger, "📤 [地址格式化] 发送给LLM的提示词", "SystemMessage:", system_prompt, stage="format")
             
             messages = [
                 SystemMessage(content=system_prompt)
             ]
             
-            response = await self.llm.ainvoke(messages)
-            content = response.content.strip()
+            content = (await self._invoke_llm("format", messages)).strip()
             
             # 记录LLM的响应
-            logger.info(f"📥 [地址格式化] LLM原始响应: {content}")
-            logger.info(f"🔍 LLM地址回答: {content}")
+            log_body(logger, "📥 [地址格式化] LLM原始响应", content, stage="format")
             
             # 简单解析LLM的回答
             if ',' in content:
                 addresses = [addr.strip() for addr in content.split(',')]
                 if len(addresses) == 2:
-                    logger.info(f"✅ 地址解析成功: {addresses}")
+                    logger.info("✅ 地址解析成功: %s", addresses)
                     return addresses
             
             # 如果解析失败，再试一次用更简单的prompt
+            self._discard_llm_cache("format", messages)
             return await self._simple_retry_format(locations, user_city_input)
                 
         except Exception as e:
             logger.error(f"❌ 地址格式化异常: {e}")
+            self._discard_llm_cache("format", messages)
             return await self._simple_retry_format(locations, user_city_input)
 
     async def _simple_retry_format(self, locations: List[str], user_city_input: str) -> List[str]:
         """简单重试地址格式化 - 使用更直接的LLM提示"""
+        set_attribute("retry_count", 1)
         logger.info(f"🔄 简单重试地址格式化")
         
         simple_prompt = f"""用户要从"{locations[0]}"到"{locations[1]}"。
@@ -381,19 +668,16 @@ class SimpleRouteAgent:
 
         try:
             # 记录发送给LLM的提示词
-            logger.info("📤 [重试地址格式化] 发送给LLM的提示词:")
-            logger.info(f"SystemMessage: {simple_prompt}")
+            log_body(logger, "📤 [重试地址格式化] 发送给LLM的提示词", "SystemMessage:", simple_prompt, stage="format_retry")
             
             messages = [
                 SystemMessage(content=simple_prompt)
             ]
             
-            response = await self.llm.ainvoke(messages)
-            content = response.content.strip()
+            content = (await self._invoke_llm("format_retry", messages)).strip()
             
             # 记录LLM的响应
-            logger.info(f"📥 [重试地址格式化] LLM原始响应: {content}")
-            logger.info(f"🔍 重试LLM回答: {content}")
+            log_body(logger, "📥 [重试地址格式化] LLM原始响应", content, stage="format_retry")
             
             # 提取地址
             lines = [line.strip() for line in content.split('\n') if line.strip()]
@@ -413,20 +697,33 @@ class SimpleRouteAgent:
             
             if len(addresses) >= 2:
                 result = addresses[:2]
-                logger.info(f"✅ 重试解析成功: {result}")
+                logger.info("✅ 重试解析成功: %s", result)
                 return result
             
             logger.error(f"❌ 重试解析失败，无法提取有效地址")
+            self._discard_llm_cache("format_retry", messages)
             return []
                 
         except Exception as e:
             logger.error(f"❌ 重试地址格式化失败: {e}")
+            self._discard_llm_cache("format_retry", messages)
             return []
 
+    @traced("step4_geocode", stage="geocode")
+    @observe_stage("geocode", failed=lambda result: result is None)
     async def step4_geocode(self, address: str) -> Optional[str]:
         """步骤4: 地理编码获取经纬度"""
         logger.info(f"🗺️ 地理编码: {address}")
         
+        hit, cached = self.geocode_cache.get(address)
+        set_attribute("cache_hit", hit)
+        if hit:
+            if cached:
+                logger.info(f"⚡ 地理编码缓存命中: {address} -> {cached}")
+            else:
+                logger.info(f"⚡ 地理编码负缓存命中: {address}")
+            return cached
+        
         tool = self.get_tool("maps_geo")
         if not tool:
             logger.error("❌ 地理编码工具未找到")
@@ -436,39 +733,104 @@ class SimpleRouteAgent:
             result = await tool.ainvoke({"address": address})
             data = json.loads(result)
             
-            logger.info(f"🔍 地理编码原始数据: {str(data)[:200]}...")
+            logger.debug("🔍 地理编码原始数据: %.200s", data)
             
             # 检查API响应 - 修复判断逻辑
             if data.get("status") == "0":
-                logger.warning(f"❌ 地理编码API错误: {data}")
+                # 配额、密钥等错误不代表地址不存在，不写入负缓存
+                logger.warning("❌ 地理编码API错误: %.500s", data)
                 return None
             
             # 提取坐标 - 支持多种数据格式
-            location = None
+            item = None
             
             # 尝试从results中获取（AMAP地理编码API的标准响应）
             if data.get("results") and isinstance(data["results"], list) and data["results"]:
-                location = data["results"][0].get("location")
+                item = data["results"][0]
             
             # 尝试从geocodes中获取（备用格式）
             elif data.get("geocodes") and isinstance(data["geocodes"], list) and data["geocodes"]:
-                location = data["geocodes"][0].get("location")
+                item = data["geocodes"][0]
             
+            location = item.get("location") if isinstance(item, dict) else None
             if location:
                 logger.info(f"✅ 地理编码成功: {address} -> {location}")
+                self.geocode_cache.set(address, location)
+                # 记录所在城市，供公共交通规划使用
+                division = DivisionIndex.parse(item)
+                if division:
+                    self.division_index.set(location, division)
                 return location
                      
             logger.warning(f"❌ 未找到坐标: {address}")
+            geocodes = data.get("results", data.get("geocodes"))
+            if isinstance(geocodes, list) and not geocodes:
+                # 查询成功但没有结果，地址确实无法解析
+                self.geocode_cache.set_negative(address)
             return None
                 
         except Exception as e:
             logger.error(f"❌ 地理编码异常: {e}")
             return None
 
+    async def geocode_many(self, addresses: List[str], concurrency: Optional[int] = None) -> List[Optional[str]]:
+        """批量地理编码：重复地址只请求一次，不同地址并发请求（concurrency 限制并发数）"""
+        unique_addresses = list(dict.fromkeys(addresses))
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        
+        async def geocode(address: str) -> Optional[str]:
+            if semaphore is None:
+                return await self.step4_geocode(address)
+            async with semaphore:
+                return await self.step4_geocode(address)
+        
+        results = await asyncio.gather(*(geocode(addr) for addr in unique_addresses))
+        coords_map = dict(zip(unique_addresses, results))
+        return [coords_map[addr] for addr in addresses]
+
+    async def prefetch_geocodes(self, locations: List[str], cities: List[str]) -> Dict[str, str]:
+        """预取: 对每个候选城市下的每个地点做地理编码，返回 规范化地址 -> 坐标
+        
+        受全局并发上限约束，结果同时写入地理编码缓存
+        """
+        addresses = []
+        for city in cities:
+            city_prefix = city if city.endswith("市") else f"{city}市"
+            addresses.extend(f"{city_prefix}{location}" for location in locations)
+        
+        async def geocode_limited(address: str) -> Optional[str]:
+            async with self.prefetch_semaphore:
+                return await self.step4_geocode(address)
+        
+        unique_addresses = list(dict.fromkeys(addresses))
+        results = await asyncio.gather(*(geocode_limited(addr) for addr in unique_addresses))
+        return {normalize_text(addr): coords for addr, coords in zip(unique_addresses, results) if coords}
+
+    @traced("step5_get_distance", stage="distance")
+    @observe_stage("distance", failed=lambda result: result is None)
     async def step5_get_distance(self, start_coords: str, end_coords: str) -> Optional[int]:
-        """步骤5: 获取两点距离"""
+        """步骤5: 获取两点距离
+        
+        默认使用本地直线距离估算，仅当估算值接近步行/公共交通分界时才调用远程距离工具
+        """
         logger.info(f"📏 获取距离: {start_coords} -> {end_coords}")
         
+        try:
+            distance = estimate_distance(start_coords, end_coords)
+        except ValueError as e:
+            logger.warning(f"⚠️ 本地距离估算失败，改用远程距离工具: {e}")
+            return await self._remote_distance(start_coords, end_coords)
+        
+        logger.info(f"✅ 本地估算距离: {distance}米")
+        if DISTANCE_REMOTE_REFINE and abs(distance - WALKING_DISTANCE_THRESHOLD) <= DISTANCE_REFINE_MARGIN:
+            remote_distance = await self._remote_distance(start_coords, end_coords)
+            if remote_distance is not None:
+                return remote_distance
+        
+        return distance
+
+    async def _remote_distance(self, start_coords: str, end_coords: str) -> Optional[int]:
+        """调用远程距离工具获取两点距离"""
         tool = self.get_tool("maps_distance")
         if not tool:
             logger.error("❌ 距离工具未找到")
@@ -492,18 +854,79 @@ class SimpleRouteAgent:
         
         return None
 
-    async def step6_plan_route(self, start_coords: str, end_coords: str, distance: int) -> Optional[Dict]:
+    @traced("distance_matrix", stage="distance_matrix")
+    @observe_stage("distance_matrix")
+    async def distance_matrix(self, origins: List[str], destinations: List[str],
+                              distance_type: str = "1", concurrency: int = 8) -> DistanceMatrix:
+        """多对一距离矩阵: 每个终点一组请求，起点按API上限打包（"|"分隔），分块并发请求
+        
+        直线距离（distance_type 为 "0"）在本地计算，不发起请求
+        """
+        if distance_type == "0":
+            logger.info(f"📐 直线距离矩阵: {len(origins)}×{len(destinations)}, 本地计算")
+            return DistanceMatrix.straight_line(origins, destinations)
+        matrix = DistanceMatrix.empty(origins, destinations)
+        tool = self.get_tool("maps_distance")
+        if not tool:
+            logger.error("❌ 距离工具未找到")
+            return matrix
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch_chunk(dest_index: int, offset: int, chunk: List[str]):
+            try:
+                async with semaphore:
+                    result = await tool.ainvoke({
+                        "origins": "|".join(chunk),
+                        "destination": destinations[dest_index],
+                        "type": distance_type
+                    })
+                data = json.loads(result)
+                for position, item in enumerate(data.get("results") or []):
+                    # origin_id 从1开始，对应本块内起点顺序
+                    origin_index = offset + int(item.get("origin_id", position + 1)) - 1
+                    if offset <= origin_index < offset + len(chunk):
+                        matrix.distances[origin_index, dest_index] = float(item.get("distance") or "nan")
+                        matrix.durations[origin_index, dest_index] = float(item.get("duration") or "nan")
+            except Exception as e:
+                logger.error(f"❌ 距离矩阵分块获取失败 (终点{dest_index}, 起点{offset}起): {e}")
+        
+        chunks = [
+            (dest_index, offset, origins[offset:offset + DISTANCE_MAX_ORIGINS])
+            for dest_index in range(len(destinations))
+            for offset in range(0, len(origins), DISTANCE_MAX_ORIGINS)
+        ]
+        logger.info(f"📐 距离矩阵: {len(origins)}×{len(destinations)}, {len(chunks)} 次请求")
+        await asyncio.gather(*(fetch_chunk(*chunk) for chunk in chunks))
+        return matrix
+
+    @traced("step6_plan_route", stage="route")
+    @observe_stage("route", failed=lambda result: result is None)
+    async def step6_plan_route(self, start_coords: str, end_coords: str, distance: int) -> Optional[Route]:
         """步骤6: 根据距离选择路径规划方式"""
         logger.info(f"🚀 步骤6: 路径规划 (距离: {distance}米)")
         
-        if distance <= 1000:
+        mode = "walking" if distance <= WALKING_DISTANCE_THRESHOLD else "transit"
+        cached_route = self.route_cache.get(mode, start_coords, end_coords)
+        set_attribute("mode", mode)
+        set_attribute("cache_hit", bool(cached_route))
+        if cached_route:
+            logger.info(f"⚡ 路线缓存命中: {mode} {start_coords} -> {end_coords}")
+            return cached_route
+        
+        if mode == "walking":
             # 距离小于等于1km，使用步行规划
-            return await self._plan_walking(start_coords, end_coords)
+            route_data = await self._plan_walking(start_coords, end_coords)
         else:
             # 距离大于1km，使用公共交通规划
-            return await self._plan_transit(start_coords, end_coords)
+            route_data = await self._plan_transit(start_coords, end_coords)
+        
+        if route_data:
+            self.route_cache.set(mode, start_coords, end_coords, route_data)
+        return route_data
 
-    async def _plan_walking(self, start_coords: str, end_coords: str) -> Optional[Dict]:
+    @traced("_plan_walking")
+    async def _plan_walking(self, start_coords: str, end_coords: str) -> Optional[Route]:
         """步行路径规划"""
         logger.info("🚶 规划步行路线")
         
@@ -517,249 +940,311 @@ class SimpleRouteAgent:
                 "origin": start_coords,
                 "destination": end_coords
             })
-            data = json.loads(result)
-            
-            if data.get("route") and data["route"].get("paths"):
-                path = data["route"]["paths"][0]
-                return {
-                    "type": "walking",
-                    "distance": int(path.get("distance", 0)),
-                    "duration": int(path.get("duration", 0)) // 60,
-                    "steps": path.get("steps", []),
-                    "raw_data": data
-                }
+            return Route.parse_walking(json.loads(result), keep_raw=ROUTE_DEBUG)
         except Exception as e:
             logger.error(f"❌ 步行规划失败: {e}")
         
         return None
 
-    async def _plan_transit(self, start_coords: str, end_coords: str) -> Optional[Dict]:
-        """公共交通路径规划"""
-        logger.info("🚇 规划公共交通路线")
+    async def locate_division(self, coords: str) -> Optional[Dict[str, str]]:
+        """查询坐标所在城市：优先使用地理编码时记录的行政区划，其次调用逆地理编码（若可用）"""
+        division = self.division_index.get(coords)
+        if division or "maps_regeocode" not in self.tool_registry.tools:
+            return division
         
+        tool = self.get_tool("maps_regeocode")
+        if not tool:
+            return None
+        try:
+            data = json.loads(await tool.ainvoke({"location": coords}))
+            # 兼容 MCP 精简格式和高德 Web API 的 regeocode.addressComponent 格式
+            component = (data.get("regeocode") or {}).get("addressComponent") or data
+            division = DivisionIndex.parse(component)
+            if division:
+                self.division_index.set(coords, division)
+            return division
+        except Exception as e:
+            logger.warning(f"⚠️ 逆地理编码失败: {coords}: {e}")
+            return None
+
+    @traced("_plan_transit")
+    async def _plan_transit(self, start_coords: str, end_coords: str) -> Optional[Route]:
+        """公共交通路径规划，起终点可在不同城市"""
         tool = self.get_tool("maps_direction_transit_integrated")
         if not tool:
             logger.error("❌ 公共交通规划工具未找到")
             return None
         
+        # 高德公共交通规划需要起点城市和终点城市，citycode 优先
+        origin, destination = await asyncio.gather(
+            self.locate_division(start_coords), self.locate_division(end_coords)
+        )
+        origin_city = (origin["citycode"] or origin["city"]) if origin else ""
+        destination_city = (destination["citycode"] or destination["city"]) if destination else ""
+        city = origin_city or destination_city or TRANSIT_DEFAULT_CITY
+        cityd = destination_city or city
+        set_attribute("city", city)
+        set_attribute("cityd", cityd)
+        logger.info(f"🚇 规划公共交通路线 ({city} -> {cityd})")
+        
         try:
             result = await tool.ainvoke({
                 "origin": start_coords,
                 "destination": end_coords,
-                "city": "深圳",
-                "cityd": "深圳"
+                "city": city,
+                "cityd": cityd
             })
-            data = json.loads(result)
-            
-            if data.get("transits") and data["transits"]:
-                transit = data["transits"][0]
-                return {
-                    "type": "transit",
-                    "duration": int(transit.get("duration", 0)) // 60,
-                    "walking_distance": int(transit.get("walking_distance", 0)),
-                    "segments": transit.get("segments", []),
-                    "distance": int(data.get("distance", 0)),
-                    "raw_data": data
-                }
+            return Route.parse_transit(json.loads(result), keep_raw=ROUTE_DEBUG)
                 
         except Exception as e:
             logger.error(f"❌ 公共交通规划失败: {e}")
         
         return None
 
-    def format_route_result(self, route_data: Dict, start_addr: str, end_addr: str, distance: int) -> str:
+    def format_route_result(self, route: Optional[Route], start_addr: str, end_addr: str, distance: int) -> str:
         """格式化路径规划结果 - 增强版，显示详细步骤"""
-        if not route_data:
+        if not route:
             return f"❌ 无法获取从 {start_addr} 到 {end_addr} 的路线信息"
         
-        response = f"🗺️ **从 {start_addr} 到 {end_addr} 的路线规划**\n\n"
-        response += f"📏 **直线距离**: {distance}米\n\n"
+        parts = [
+            f"🗺️ **从 {start_addr} 到 {end_addr} 的路线规划**\n\n",
+            f"📏 **直线距离**: {distance}米\n\n",
+        ]
         
-        def safe_int(value, default=0):
-            """安全的整数转换"""
-            try:
-                return int(float(str(value))) if value else default
-            except (ValueError, TypeError):
-                return default
-        
-        def safe_duration_minutes(value, default=0):
-            """安全的时间转换为分钟"""
-            try:
-                duration_seconds = int(float(str(value))) if value else default
-                return max(1, duration_seconds // 60)  # 至少1分钟
-            except (ValueError, TypeError):
-                return default
-        
-        if route_data["type"] == "walking":
-            response += f"## 🚶 步行方案\n"
-            response += f"**距离**: {route_data['distance']}米\n"
-            response += f"**时间**: 约{route_data['duration']}分钟\n\n"
+        if route.type == "walking":
+            parts.append(f"## 🚶 步行方案\n")
+            parts.append(f"**距离**: {route.distance}米\n")
+            parts.append(f"**时间**: 约{route.duration}分钟\n\n")
             
             # 显示详细步行路线
-            steps = route_data.get("steps", [])
-            if steps:
-                response += f"**详细路线** ({len(steps)}个步骤):\n"
-                for i, step in enumerate(steps, 1):
-                    instruction = step.get("instruction", "继续前行")
-                    distance_step = safe_int(step.get("distance", 0))
-                    duration_step = safe_duration_minutes(step.get("duration", 0))
-                    road_name = step.get("road_name", "")
-                    
-                    response += f"  **{i}.** {instruction}"
-                    if road_name:
-                        response += f" (沿{road_name})"
-                    response += f" - {distance_step}米"
-                    if duration_step > 0:
-                        response += f", 约{duration_step}分钟"
-                    response += "\n"
-        
-        elif route_data["type"] == "transit":
-            response += f"## 🚇 公共交通方案\n"
-            response += f"**总时间**: 约{route_data['duration']}分钟\n"
-            response += f"**步行距离**: {route_data['walking_distance']}米\n\n"
+            if route.steps:
+                parts.append(f"**详细路线** ({len(route.steps)}个步骤):\n")
+                for i, step in enumerate(route.steps, 1):
+                    parts.append(f"  **{i}.** {step.instruction or '继续前行'}")
+                    if step.road:
+                        parts.append(f" (沿{step.road})")
+                    parts.append(f" - {step.distance}米")
+                    minutes = duration_minutes(step.duration)
+                    if minutes > 0:
+                        parts.append(f", 约{minutes}分钟")
+                    parts.append("\n")
+        
+        elif route.type == "transit":
+            parts.append(f"## 🚇 公共交通方案\n")
+            parts.append(f"**总时间**: 约{route.duration}分钟\n")
+            parts.append(f"**步行距离**: {route.walking_distance}米\n\n")
             
             # 显示详细公共交通路线
-            segments = route_data.get("segments", [])
-            if segments:
-                response += f"**详细路线**:\n\n"
+            if route.segments:
+                parts.append(f"**详细路线**:\n\n")
                 
                 step_counter = 1
                 
-                for i, segment in enumerate(segments, 1):
+                for segment in route.segments:
                     # 每个segment可能包含walking + bus两个部分
                     
                     # 1. 步行部分（如果存在）
-                    if segment.get("walking"):
-                        walking = segment["walking"]
-                        walk_distance = safe_int(walking.get("distance", 0))
-                        walk_duration = safe_duration_minutes(walking.get("duration", 0))
+                    if segment.walking:
+                        walking = segment.walking
+                        parts.append(f"**{step_counter}. 🚶 步行到站点**\n")
+                        walk_duration = duration_minutes(walking.duration)
+                        if walk_duration > 0:
+                            parts.append(f"   距离: {walking.distance}米, 时间: 约{walk_duration}分钟\n")
+                        else:
+                            parts.append(f"   距离: {walking.distance}米\n")
                         
-                        response += f"**{step_counter}. 🚶 步行到站点**\n"
-                        response += f"   距离: {walk_distance}米, 时间: 约{walk_duration}分钟\n"
-                        
-                        # 详细步行步骤
-                        walk_steps = walking.get("steps", [])
-                        if walk_steps and len(walk_steps) > 0:
-                            response += f"   路线: "
-                            # 显示主要的几个步骤
-                            main_steps = []
-                            for step in walk_steps[:2]:  # 前2个主要步骤
-                                instruction = step.get("instruction", "")
-                                step_distance = safe_int(step.get("distance", 0))
-                                if instruction and step_distance > 5:
-                                    main_steps.append(f"{instruction}({step_distance}米)")
-                            if main_steps:
-                                response += " → ".join(main_steps)
-                            response += "\n"
-                        response += "\n"
+                        # 详细步行步骤：显示前2个主要步骤
+                        if walking.steps:
+                            main_steps = [
+                                f"{step.instruction}({step.distance}米)"
+                                for step in walking.steps[:2]
+                                if step.instruction and step.distance > 5
+                            ]
+                            parts.append(f"   路线: {' → '.join(main_steps)}\n")
+                        parts.append("\n")
                         step_counter += 1
                     
-                    # 2. 公交段（如果存在）
-                    if segment.get("bus"):
-                        bus = segment["bus"]
-                        buslines = bus.get("buslines", [])
+                    # 2. 公交段（如果存在，取第一条线路）
+                    if segment.bus:
+                        busline = segment.bus
+                        transport_icon, transport_type = ("🚇", "地铁") if busline.is_subway else ("🚌", "公交")
+                        
+                        parts.append(f"**{step_counter}. {transport_icon} 乘坐{transport_type}**\n")
+                        parts.append(f"   线路: {busline.name}\n")
+                        
+                        # 起始站和终点站
+                        if busline.departure_stop:
+                            parts.append(f"   上车站: {busline.departure_stop}\n")
+                        if busline.arrival_stop:
+                            parts.append(f"   下车站: {busline.arrival_stop}\n")
                         
-                        if buslines:
-                            busline = buslines[0]  # 取第一条线路
-                            line_name = busline.get("name", "未知线路")
-                            line_type = busline.get("type", "")
-                            
-                            # 判断交通工具类型
-                            if "地铁" in line_name or line_type == "1":
-                                transport_icon = "🚇"
-                                transport_type = "地铁"
-                            else:
-                                transport_icon = "🚌"
-                                transport_type = "公交"
-                            
-                            response += f"**{step_counter}. {transport_icon} 乘坐{transport_type}**\n"
-                            response += f"   线路: {line_name}\n"
-                            
-                            # 起始站和终点站
-                            departure_stop = busline.get("departure_stop", {})
-                            arrival_stop = busline.get("arrival_stop", {})
-                            
-                            if departure_stop.get("name"):
-                                response += f"   上车站: {departure_stop['name']}\n"
-                            if arrival_stop.get("name"):
-                                response += f"   下车站: {arrival_stop['name']}\n"
-                            
-                            # 途经站点数和时间
-                            via_num = safe_int(busline.get("via_num", 0))
-                            bus_distance = safe_int(busline.get("distance", 0))
-                            bus_duration = safe_duration_minutes(busline.get("duration", 0))
-                            
-                            if via_num > 0:
-                                response += f"   途经: {via_num}站\n"
-                            if bus_distance > 0:
-                                response += f"   距离: {bus_distance}米\n"
-                            if bus_duration > 0:
-                                response += f"   时间: 约{bus_duration}分钟\n"
-                            
-                            # 票价信息
-                            price = safe_int(busline.get("price", 0))
-                            if price > 0:
-                                response += f"   票价: {price}元\n"
-                            
-                            response += "\n"
-                            step_counter += 1
+                        # 途经站点数、距离、时间和票价
+                        bus_duration = duration_minutes(busline.duration)
+                        if busline.via_num > 0:
+                            parts.append(f"   途经: {busline.via_num}站\n")
+                        if busline.distance > 0:
+                            parts.append(f"   距离: {busline.distance}米\n")
+                        if bus_duration > 0:
+                            parts.append(f"   时间: 约{bus_duration}分钟\n")
+                        if busline.price > 0:
+                            parts.append(f"   票价: {busline.price}元\n")
+                        
+                        parts.append("\n")
+                        step_counter += 1
                 
                 # 总结信息
-                response += f"**路线总结**:\n"
-                walking_parts = sum(1 for s in segments if s.get("walking"))
-                transit_parts = sum(1 for s in segments if s.get("bus") and s["bus"].get("buslines"))
-                response += f"• 步行段: {walking_parts}个\n"
-                response += f"• 乘车段: {transit_parts}个\n"
+                parts.append(f"**路线总结**:\n")
+                walking_parts = sum(1 for segment in route.segments if segment.walking)
+                transit_parts = sum(1 for segment in route.segments if segment.bus)
+                parts.append(f"• 步行段: {walking_parts}个\n")
+                parts.append(f"• 乘车段: {transit_parts}个\n")
                 if transit_parts > 1:
-                    response += f"• 需要换乘: {transit_parts - 1}次\n"
+                    parts.append(f"• 需要换乘: {transit_parts - 1}次\n")
         
-        return response
+        return "".join(parts)
 
     async def close(self):
         """关闭客户端"""
-        pass
+        await self.tool_registry.close()
+        self.geocode_cache.close()
+        self.division_index.close()
+        self.llm_cache.close()
 
 # 新增清除会话API端点
 @app.delete("/session/{session_id}")
 async def clear_session(session_id: str):
     """清除指定会话的状态"""
-    if session_id in session_store:
-        del session_store[session_id]
+    cancel_prefetch(session_id)
+    if await session_store.adelete(session_id):
         return {"message": f"会话 {session_id} 已清除"}
     return {"message": f"会话 {session_id} 不存在"}
 
 # 初始化函数
-async def init_agent():
+async def init_agent(llm=None):
     global route_agent
-    route_agent = SimpleRouteAgent()
+    route_agent = SimpleRouteAgent(llm=llm)
     await route_agent.initialize()
+    warmup_timeout = float(os.getenv("AGENT_WARMUP_TIMEOUT", "0"))
+    if warmup_timeout > 0:
+        await route_agent.warm_up(warmup_timeout)
 
 # API 端点
 @app.on_event("startup")
 async def startup_event():
     await init_agent()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if route_agent:
+        await route_agent.close()
+    session_store.close()
+
 @app.get("/")
 async def root():
     return {"message": "路径规划智能体 API 服务运行中"}
 
+@app.get("/stats")
+async def get_stats():
+    """缓存等运行统计信息"""
+    return {
+        "sessions": await session_store.astats(),
+        "mcp": route_agent.tool_registry.stats(),
+        "mcp_resilience": route_agent.resilience.stats(),
+        "singleflight": {
+            "mcp": route_agent.tool_flight.stats(),
+            "llm": route_agent.llm_flight.stats(),
+        },
+        "geocode_cache": route_agent.geocode_cache.stats(),
+        "division_index": route_agent.division_index.stats(),
+        "route_cache": route_agent.route_cache.stats(),
+        "intent_rules": route_agent.intent_parser.stats(),
+        "llm_cache": route_agent.llm_cache.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式的运行指标（每个 worker 进程独立统计）"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/route", response_model=RouteResponse)
-async def plan_route(request: RouteRequest):
-    """路径规划接口"""
+async def plan_route(request: RouteRequest, http_request: Request):
+    """路径规划接口
+    
+    按 Accept 头返回 JSON 或 MessagePack，响应体较大时按 Accept-Encoding 进行 gzip 压缩
+    """
+    headers = http_request.headers
+    media_type = negotiate_media_type(headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(status_code=406, detail="服务端未安装 msgpack，仅支持 application/json")
+    response = await process_route_request(request)
+    return encode_response(response.model_dump(), media_type, headers.get("accept-encoding"))
+
+@app.post("/route/stream")
+async def plan_route_stream(request: RouteRequest):
+    """路径规划流式接口（SSE）
+    
+    事件依次为：start（已受理）、stage（每个阶段完成）、chunk（结果文本分段）、
+    done（响应元信息，不含 message），处理异常时发送 error
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def emit(stage: str, data: Dict):
+        await queue.put({"event": "stage", "data": json.dumps({"stage": stage, **data}, ensure_ascii=False)})
+    
+    async def run() -> RouteResponse:
+        try:
+            return await process_route_request(request, emit)
+        finally:
+            await queue.put(None)
+    
+    async def event_generator():
+        yield {"event": "start", "data": json.dumps({"session_id": request.session_id or "default"})}
+        task = asyncio.create_task(run())
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            
+            try:
+                response = task.result()
+            except HTTPException as e:
+                yield {"event": "error", "data": json.dumps({"detail": e.detail}, ensure_ascii=False)}
+                return
+            
+            # 按行分段推送结果文本
+            for chunk in response.message.splitlines(keepends=True):
+                yield {"event": "chunk", "data": json.dumps({"text": chunk}, ensure_ascii=False)}
+            yield {"event": "done", "data": response.model_dump_json(exclude={"message"})}
+        finally:
+            # 客户端断开时取消仍在进行的规划
+            if not task.done():
+                task.cancel()
+    
+    return EventSourceResponse(event_generator())
+
+@traced("plan_route")
+async def process_route_request(request: RouteRequest, emit: Optional[ProgressCallback] = None) -> RouteResponse:
+    """处理一次路径规划对话请求，emit 用于在每个阶段完成时推送进度"""
+    session_id = request.session_id or "default"
+    user_input = request.user_input
+    
+    # 获取或创建会话状态
+    session_data = await session_store.aget(session_id) or SessionData()
+    set_attribute("session_id", session_id)
+    set_attribute("session_stage", session_data.stage)
+    
     try:
-        session_id = request.session_id or "default"
-        user_input = request.user_input
-        
-        # 获取或创建会话状态
-        if session_id not in session_store:
-            session_store[session_id] = SessionData()
-        
-        session_data = session_store[session_id]
-        
         # 根据会话状态处理请求
         if session_data.stage == "start":
-            # 第一次请求：识别意图
-            intent_result = await route_agent.step1_identify_intent(user_input)
+            # 快速模式：一次LLM调用完成意图、城市和地址解析
+            fast_result = await route_agent.step1_fast_parse(user_input) if FAST_PATH_ENABLED else None
+            if fast_result and fast_result["intent_type"] == "route_request":
+                await notify_progress(emit, "fast_parse", {"intent_type": "route_request", "city_confidence": fast_result["city_confidence"]})
+                return await handle_fast_route_request(route_agent, fast_result, session_id, session_data, emit,
+                                                       request.format)
+            
+            # 第一次请求：识别意图（快速模式已识别出纠错或其他意图时直接复用）
+            intent_result = fast_result or await route_agent.step1_identify_intent(user_input)
+            await notify_progress(emit, "intent", {"intent_type": intent_result.get("intent_type")})
             
             if intent_result["intent_type"] == "route_request":
                 locations = intent_result["locations"]
@@ -777,10 +1262,12 @@ async def plan_route(request: RouteRequest):
                 # 分析城市信息
                 city_analysis = await route_agent.step2_confirm_cities(locations, user_input)
                 session_data.city_analysis = city_analysis
+                await notify_progress(emit, "city", {"need_user_input": bool(city_analysis.get("need_user_input"))})
                 
                 # 检查是否需要用户输入城市信息
                 if city_analysis.get("need_user_input"):
-                    # 需要用户确认城市
+                    # 需要用户确认城市，等待期间预取候选城市的坐标
+                    start_prefetch(route_agent, session_id, session_data)
                     return RouteResponse(
                         success=True,
                         message=f"🤔 {city_analysis.get('analysis', '')}\n\n❓ {city_analysis.get('question', '')}",
@@ -801,9 +1288,10 @@ async def plan_route(request: RouteRequest):
                             success=False,
                             message="❌ 地址格式化失败，请提供更详细的地址信息"
                         )
+                    await notify_progress(emit, "format", {"addresses": formatted_addresses})
                     
                     # 执行完整的路径规划
-                    result = await execute_route_planning(route_agent, formatted_addresses, session_data)
+                    result = await execute_route_planning(route_agent, formatted_addresses, session_data, emit, request.format)
                     return result
                 
             elif intent_result["intent_type"] == "correction":
@@ -834,9 +1322,11 @@ async def plan_route(request: RouteRequest):
                     success=False,
                     message="❌ 地址格式化失败，请重新提供清晰的城市信息"
                 )
+            await notify_progress(emit, "format", {"addresses": formatted_addresses})
             
             # 执行完整的路径规划
-            result = await execute_route_planning(route_agent, formatted_addresses, session_data)
+            result = await execute_route_planning(route_agent, formatted_addresses, session_data, emit, request.format)
+            cancel_prefetch(session_id)
             return result
         
         else:
@@ -847,12 +1337,18 @@ async def plan_route(request: RouteRequest):
                 message="❌ 会话状态异常，请重新开始"
             )
             
+    except asyncio.CancelledError:
+        # 超出时间预算或客户端断开，处理被取消
+        session_data.stage = "start"
+        raise
     except Exception as e:
         logger.error(f"API错误: {e}")
         # 重置会话状态
-        if request.session_id and request.session_id in session_store:
-            session_store[request.session_id].stage = "start"
+        session_data.stage = "start"
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 写回会话状态（共享存储后端需要显式保存）
+        await session_store.asave(session_id, session_data)
 
 @app.post("/route/confirm-city", response_model=RouteResponse)
 async def confirm_city(request: CityConfirmation):
@@ -862,25 +1358,232 @@ async def confirm_city(request: CityConfirmation):
         message="此接口已废弃，请直接在主聊天界面回复城市信息"
     )
 
-async def execute_route_planning(agent: SimpleRouteAgent, formatted_addresses: List[str], session_data: SessionData) -> RouteResponse:
-    """执行完整的路径规划流程"""
+def start_prefetch(agent: SimpleRouteAgent, session_id: str, session_data: SessionData):
+    """会话进入 waiting_city 时，在后台预取候选城市中各地点的坐标"""
+    if not PREFETCH_ENABLED:
+        return
+    candidates = [c for c in session_data.city_analysis.get("candidate_cities") or [] if isinstance(c, str) and c.strip()]
+    cities = list(dict.fromkeys([c.strip() for c in candidates[:PREFETCH_TOP_N]] + session_data.recent_cities))
+    if not cities:
+        return
+    
+    async def run():
+        logger.info(f"🔮 预取候选城市地理编码: {cities} × {session_data.locations}")
+        # 预取在请求返回后继续进行，不受该请求的时间预算限制
+        with deadline_scope(None):
+            prefetched = await agent.prefetch_geocodes(session_data.locations, cities)
+        # 重新读取会话：会话可能已被清除或已进入下一轮
+        current = await session_store.aget(session_id)
+        if current and current.stage == "waiting_city":
+            current.prefetched.update(prefetched)
+            await session_store.asave(session_id, current)
+        logger.info(f"🔮 预取完成: {len(prefetched)} 个地址")
+    
+    cancel_prefetch(session_id)
+    task = asyncio.create_task(run())
+    prefetch_tasks[session_id] = task
+    task.add_done_callback(lambda t: prefetch_tasks.pop(session_id, None) if prefetch_tasks.get(session_id) is t else None)
+
+def cancel_prefetch(session_id: str):
+    """取消会话的预取任务"""
+    task = prefetch_tasks.pop(session_id, None)
+    if task and not task.done():
+        task.cancel()
+
+def remember_cities(session_data: SessionData, addresses: List[str]):
+    """记录本次规划涉及的城市，供后续预取使用"""
+    import re
+    for address in reversed(addresses):
+        match = re.match(r"^(.{2,7}?)市", address)
+        if match:
+            city = match.group(1)
+            session_data.recent_cities = [city] + [c for c in session_data.recent_cities if c != city]
+    session_data.recent_cities = session_data.recent_cities[:PREFETCH_TOP_N]
+
+@app.post("/route/batch", response_model=BatchRouteResponse)
+async def plan_route_batch(request: BatchRouteRequest):
+    """批量路径规划接口
+    
+    面向后台任务：起终点已是完整地址或坐标，跳过意图识别、城市确认等LLM阶段和会话状态。
+    批内重复地址只编码一次，按给定并发数规划，单个起终点对失败不影响其他结果。
+    """
+    if len(request.pairs) > BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {BATCH_MAX_PAIRS} 个起终点对")
+    concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY))
+    started = time.perf_counter()
+    
+    # 批内地址去重后统一地理编码，坐标输入直接使用
+    endpoints = [p.origin for p in request.pairs] + [p.destination for p in request.pairs]
+    addresses = list(dict.fromkeys(e for e in endpoints if not is_lnglat(e)))
+    logger.info(f"📦 批量规划: {len(request.pairs)} 对, {len(addresses)} 个待编码地址")
+    coords_list = await route_agent.geocode_many(addresses, concurrency=concurrency)
+    coords_map = dict(zip(addresses, coords_list))
+    geocoded = time.perf_counter()
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def plan_pair(index: int, pair: BatchRoutePair) -> BatchRouteResult:
+        pair_started = time.perf_counter()
+        result = BatchRouteResult(index=index, id=pair.id, success=False)
+        try:
+            origin, destination = pair.origin, pair.destination
+            result.origin_coords = origin.replace(" ", "") if is_lnglat(origin) else coords_map.get(origin)
+            result.destination_coords = destination.replace(" ", "") if is_lnglat(destination) else coords_map.get(destination)
+            if not result.origin_coords:
+                result.error = f"无法找到起点 '{origin}' 的位置信息"
+            elif not result.destination_coords:
+                result.error = f"无法找到终点 '{destination}' 的位置信息"
+            else:
+                async with semaphore:
+                    result.distance = await route_agent.step5_get_distance(result.origin_coords, result.destination_coords)
+                    if result.distance is None:
+                        result.error = "无法获取距离信息"
+                    else:
+                        route_data = await route_agent.step6_plan_route(result.origin_coords, result.destination_coords, result.distance)
+                        if route_data:
+                            result.route = route_data.summary()
+                            result.success = True
+                        else:
+                            result.error = "无法获取路线信息"
+        except Exception as e:
+            logger.error(f"❌ 批量规划第{index}对失败: {e}")
+            result.error = f"路径规划过程中发生错误: {str(e)}"
+        result.elapsed_ms = round((time.perf_counter() - pair_started) * 1000, 1)
+        return result
+    
+    results = await asyncio.gather(*(plan_pair(i, pair) for i, pair in enumerate(request.pairs)))
+    finished = time.perf_counter()
+    succeeded = sum(1 for r in results if r.success)
+    logger.info(f"📦 批量规划完成: 成功 {succeeded}/{len(results)}, 耗时 {finished - started:.2f}秒")
+    
+    return BatchRouteResponse(
+        results=results,
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        unique_addresses=len(addresses),
+        geocode_ms=round((geocoded - started) * 1000, 1),
+        planning_ms=round((finished - geocoded) * 1000, 1),
+        total_ms=round((finished - started) * 1000, 1)
+    )
+
+@app.post("/distance/matrix")
+async def distance_matrix(request: DistanceMatrixRequest):
+    """距离矩阵接口：计算每个起点到每个终点的距离，并给出每个起点最近的终点
+    
+    适用于"离每个客户最近的门店/站点"类查询，起点批量打包请求，无需逐对调用
+    """
+    if len(request.origins) * len(request.destinations) > MATRIX_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"起点数 × 终点数不能超过 {MATRIX_MAX_CELLS}")
+    concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY))
+    started = time.perf_counter()
+    
+    # 地址先地理编码，坐标输入直接使用
+    endpoints = request.origins + request.destinations
+    addresses = list(dict.fromkeys(e for e in endpoints if not is_lnglat(e)))
+    coords_map = dict(zip(addresses, await route_agent.geocode_many(addresses, concurrency=concurrency)))
+    resolved = [e.replace(" ", "") if is_lnglat(e) else coords_map.get(e) for e in endpoints]
+    origin_coords = resolved[:len(request.origins)]
+    destination_coords = resolved[len(request.origins):]
+    
+    unresolved = [endpoints[i] for i, coords in enumerate(resolved) if not coords]
+    if unresolved:
+        raise HTTPException(status_code=400, detail=f"无法找到以下地址的位置信息: {unresolved[:10]}")
+    
+    matrix = await route_agent.distance_matrix(origin_coords, destination_coords, request.type, concurrency)
+    result = matrix.to_dict()
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+async def handle_fast_route_request(agent: SimpleRouteAgent, parsed: Dict, session_id: str, session_data: SessionData,
+                                    emit: Optional[ProgressCallback] = None,
+                                    output_format: str = "markdown") -> RouteResponse:
+    """处理快速模式识别出的路径规划请求
+    
+    城市置信度高时直接规划路线；置信度低时进入 waiting_city 多轮流程询问用户
+    """
+    locations = parsed.get("locations") or []
+    if len(locations) != 2:
+        return RouteResponse(
+            success=False,
+            message="❌ 未能正确识别起点和终点"
+        )
+    
+    # 保存会话状态
+    session_data.locations = locations
+    session_data.intent_result = {"intent_type": "route_request", "locations": locations}
+    
+    if parsed["city_confidence"] == "high":
+        session_data.stage = "processing"
+        session_data.city_analysis = {
+            "need_user_input": False,
+            "analysis": parsed.get("analysis", "")
+        }
+        return await execute_route_planning(agent, parsed["addresses"], session_data, emit, output_format)
+    
+    # 城市不确定，询问用户
+    question = parsed.get("question") or f"请告诉我'{locations[0]}'和'{locations[1]}'分别在哪个城市？"
+    session_data.stage = "waiting_city"
+    session_data.city_analysis = {
+        "need_user_input": True,
+        "question": question,
+        "analysis": parsed.get("analysis", ""),
+        "candidate_cities": parsed.get("candidate_cities") or []
+    }
+    start_prefetch(agent, session_id, session_data)
+    return RouteResponse(
+        success=True,
+        message=f"🤔 {parsed.get('analysis', '')}\n\n❓ {question}",
+        need_city_confirmation=True,
+        session_id=session_id
+    )
+
+async def geocode_endpoints(agent: SimpleRouteAgent, addresses: List[str]) -> Tuple[List[str], Optional[int]]:
+    """并发地理编码起点和终点，任一端失败时立即取消另一端的请求
+    
+    返回 (坐标列表, 失败端点的下标)，全部成功时下标为 None
+    """
+    tasks = [asyncio.create_task(agent.step4_geocode(address)) for address in addresses]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # 按起点、终点顺序检查，同时失败时优先报告起点
+            for index, task in enumerate(tasks):
+                if task in done and not task.result():
+                    return [], index
+        return [task.result() for task in tasks], None
+    finally:
+        for task in pending:
+            task.cancel()
+
+@traced("execute_route_planning")
+async def execute_route_planning(agent: SimpleRouteAgent, formatted_addresses: List[str], session_data: SessionData,
+                                 emit: Optional[ProgressCallback] = None,
+                                 output_format: str = "markdown") -> RouteResponse:
+    """执行完整的路径规划流程，output_format 见 RouteRequest.format"""
     try:
-        # 地理编码
-        start_coords = await agent.step4_geocode(formatted_addresses[0])
-        if not start_coords:
+        # 地理编码：优先使用预取结果，否则起点和终点并发进行
+        prefetched = [session_data.prefetched.get(normalize_text(addr)) for addr in formatted_addresses[:2]]
+        if all(prefetched):
+            logger.info("🔮 使用预取的地理编码结果: %s", prefetched)
+            coords, failed_index = prefetched, None
+        else:
+            coords, failed_index = await geocode_endpoints(agent, formatted_addresses[:2])
+        if failed_index == 0:
             session_data.stage = "start"
             return RouteResponse(
                 success=False,
                 message=f"❌ 无法找到起点 '{formatted_addresses[0]}' 的位置信息，请检查地址是否正确"
             )
-            
-        end_coords = await agent.step4_geocode(formatted_addresses[1])
-        if not end_coords:
+        if failed_index == 1:
             session_data.stage = "start"
             return RouteResponse(
                 success=False,
                 message=f"❌ 无法找到终点 '{formatted_addresses[1]}' 的位置信息，请检查地址是否正确"
             )
+        start_coords, end_coords = coords
+        await notify_progress(emit, "geocode", {"start": start_coords, "end": end_coords})
         
         # 获取距离
         distance = await agent.step5_get_distance(start_coords, end_coords)
@@ -890,21 +1593,40 @@ async def execute_route_planning(agent: SimpleRouteAgent, formatted_addresses: L
                 success=False,
                 message="❌ 无法获取距离信息"
             )
+        await notify_progress(emit, "distance", {"distance": distance})
         
         # 路径规划
         route_data = await agent.step6_plan_route(start_coords, end_coords, distance)
-        result = agent.format_route_result(route_data, formatted_addresses[0], formatted_addresses[1], distance)
+        await notify_progress(emit, "route", {"type": route_data.type if route_data else None})
+        # 只要结构化结果时不生成 Markdown 文本（规划失败时仍返回失败说明）
+        if route_data is None or output_format != "structured":
+            result = agent.format_route_result(route_data, formatted_addresses[0], formatted_addresses[1], distance)
+        else:
+            result = ""
+        structured_route = None
+        if route_data is not None and output_format in STRUCTURED_FORMATS:
+            structured_route = {
+                "origin": formatted_addresses[0],
+                "destination": formatted_addresses[1],
+                "origin_coords": start_coords,
+                "destination_coords": end_coords,
+                "straight_distance": distance,
+                **route_data.to_dict(),
+            }
         
         # 重置会话状态
+        remember_cities(session_data, formatted_addresses)
         session_data.stage = "start"
         session_data.locations = []
         session_data.intent_result = {}
         session_data.city_analysis = {}
+        session_data.prefetched = {}
         
         return RouteResponse(
             success=True,
             message=result,
-            need_city_confirmation=False
+            need_city_confirmation=False,
+            route=structured_route
         )
         
     except Exception as e:
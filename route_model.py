@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+路线数据模型
+高德路径规划响应只解析一次，保留格式化和摘要用到的字段；
+原始响应（含所有备选方案的 polyline）仅在调试模式下保留
+"""
+
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+
+def _int(value: Any) -> int:
+    """高德数值字段可能是字符串、浮点数或空列表"""
+    try:
+        return int(float(value)) if value not in (None, "", []) else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _str(value: Any) -> str:
+    """高德空字段常以 [] 表示"""
+    return value if isinstance(value, str) else ""
+
+
+def duration_minutes(seconds: int) -> int:
+    """秒转分钟，非零时至少1分钟；高德时长缺失或为0时返回0，由调用方省略时间"""
+    return max(1, seconds // 60) if seconds > 0 else 0
+
+
+def _fields(obj) -> Dict[str, Any]:
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+
+@dataclass
+class WalkStep:
+    """步行路线中的一步"""
+    __slots__ = ("instruction", "road", "distance", "duration")
+    instruction: str
+    road: str
+    distance: int  # 米
+    duration: int  # 秒
+
+    @classmethod
+    def parse(cls, step: Dict) -> "WalkStep":
+        return cls(
+            instruction=_str(step.get("instruction")),
+            road=_str(step.get("road_name")) or _str(step.get("road")),
+            distance=_int(step.get("distance")),
+            duration=_int(step.get("duration")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _fields(self)
+
+
+@dataclass
+class WalkingLeg:
+    """公共交通方案中的步行段"""
+    __slots__ = ("distance", "duration", "steps")
+    distance: int  # 米
+    duration: int  # 秒
+    steps: List[WalkStep]
+
+    @classmethod
+    def parse(cls, walking: Dict) -> "WalkingLeg":
+        return cls(
+            distance=_int(walking.get("distance")),
+            duration=_int(walking.get("duration")),
+            steps=[WalkStep.parse(step) for step in walking.get("steps") or [] if isinstance(step, dict)],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"distance": self.distance, "duration": self.duration, "steps": [step.to_dict() for step in self.steps]}
+
+
+@dataclass
+class BusLine:
+    """公共交通方案中乘坐的线路（只保留首选线路）"""
+    __slots__ = ("name", "type", "departure_stop", "arrival_stop", "via_num", "distance", "duration", "price")
+    name: str
+    type: str
+    departure_stop: str
+    arrival_stop: str
+    via_num: int
+    distance: int  # 米
+    duration: int  # 秒
+    price: int  # 元
+
+    @property
+    def is_subway(self) -> bool:
+        return "地铁" in self.name or self.type == "1"
+
+    @classmethod
+    def parse(cls, busline: Dict) -> "BusLine":
+        departure = busline.get("departure_stop")
+        arrival = busline.get("arrival_stop")
+        return cls(
+            name=_str(busline.get("name")) or "未知线路",
+            type=_str(busline.get("type")),
+            departure_stop=_str(departure.get("name")) if isinstance(departure, dict) else "",
+            arrival_stop=_str(arrival.get("name")) if isinstance(arrival, dict) else "",
+            via_num=_int(busline.get("via_num")),
+            distance=_int(busline.get("distance")),
+            duration=_int(busline.get("duration")),
+            price=_int(busline.get("price")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(_fields(self), is_subway=self.is_subway)
+
+
+@dataclass
+class TransitSegment:
+    """公共交通方案的一段：可能先步行，再乘车"""
+    __slots__ = ("walking", "bus")
+    walking: Optional[WalkingLeg]
+    bus: Optional[BusLine]
+
+    @classmethod
+    def parse(cls, segment: Dict) -> "TransitSegment":
+        walking = segment.get("walking")
+        bus = segment.get("bus")
+        buslines = bus.get("buslines") if isinstance(bus, dict) else None
+        return cls(
+            walking=WalkingLeg.parse(walking) if isinstance(walking, dict) and walking else None,
+            bus=BusLine.parse(buslines[0]) if buslines and isinstance(buslines[0], dict) else None,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "walking": self.walking.to_dict() if self.walking else None,
+            "bus": self.bus.to_dict() if self.bus else None,
+        }
+
+
+@dataclass
+class Route:
+    """一条规划好的路线"""
+    __slots__ = ("type", "distance", "duration", "walking_distance", "steps", "segments", "raw_data")
+    type: str  # walking | transit
+    distance: int  # 米
+    duration: int  # 分钟
+    walking_distance: int  # 米，仅公共交通
+    steps: List[WalkStep]  # 仅步行
+    segments: List[TransitSegment]  # 仅公共交通
+    raw_data: Optional[Dict]  # 原始响应，仅调试模式保留
+
+    @classmethod
+    def parse_walking(cls, data: Dict, keep_raw: bool = False) -> Optional["Route"]:
+        """解析 maps_direction_walking 响应，没有可用路线时返回 None"""
+        paths = (data.get("route") or {}).get("paths")
+        if not paths:
+            return None
+        path = paths[0]
+        return cls(
+            type="walking",
+            distance=_int(path.get("distance")),
+            duration=_int(path.get("duration")) // 60,
+            walking_distance=0,
+            steps=[WalkStep.parse(step) for step in path.get("steps") or [] if isinstance(step, dict)],
+            segments=[],
+            raw_data=data if keep_raw else None,
+        )
+
+    @classmethod
+    def parse_transit(cls, data: Dict, keep_raw: bool = False) -> Optional["Route"]:
+        """解析 maps_direction_transit_integrated 响应，只保留首选方案"""
+        transits = data.get("transits")
+        if not transits:
+            return None
+        transit = transits[0]
+        return cls(
+            type="transit",
+            distance=_int(data.get("distance")),
+            duration=_int(transit.get("duration")) // 60,
+            walking_distance=_int(transit.get("walking_distance")),
+            steps=[],
+            segments=[TransitSegment.parse(segment) for segment in transit.get("segments") or [] if isinstance(segment, dict)],
+            raw_data=data if keep_raw else None,
+        )
+
+    def without_raw(self) -> "Route":
+        """去掉原始响应的副本（用于缓存）"""
+        return replace(self, raw_data=None) if self.raw_data is not None else self
+
+    @property
+    def lines(self) -> List[str]:
+        return [segment.bus.name for segment in self.segments if segment.bus]
+
+    def summary(self) -> Dict[str, Any]:
+        """结构化摘要（不含详细步骤和原始数据）"""
+        summary = {
+            "type": self.type,
+            "distance": self.distance,
+            "duration": self.duration,
+        }
+        if self.type == "transit":
+            lines = self.lines
+            summary["walking_distance"] = self.walking_distance
+            summary["lines"] = lines
+            summary["transfers"] = max(0, len(lines) - 1)
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        """完整的结构化路线（摘要 + 步骤/分段），不含原始数据
+
+        时长字段：路线总时长为分钟，步骤、步行段和线路的时长为秒
+        """
+        route = self.summary()
+        if self.type == "transit":
+            route["segments"] = [segment.to_dict() for segment in self.segments]
+        else:
+            route["steps"] = [step.to_dict() for step in self.steps]
+        return route
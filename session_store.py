@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+会话存储
+带空闲过期和容量上限的会话存储，支持进程内内存和可被多个 worker 共享的 SQLite 两种后端
+异步代码通过 aget / asave / adelete / astats 访问，SQLite 后端在线程池中执行，不阻塞事件循环
+"""
+
+import asyncio
+import functools
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generic, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+
+def serialize_session(session: BaseModel) -> str:
+    """紧凑序列化：省略默认值字段"""
+    return session.model_dump_json(exclude_defaults=True)
+
+
+class SessionStore(ABC, Generic[T]):
+    """会话存储接口
+
+    get 返回的会话修改后需调用 save 写回；超过 ttl 未写入的会话视为过期
+    """
+
+    def __init__(self, model_cls: Type[T], ttl: float = 1800, max_entries: int = 10000):
+        self.model_cls = model_cls
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[T]:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, session: T):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    async def aget(self, session_id: str) -> Optional[T]:
+        return self.get(session_id)
+
+    async def asave(self, session_id: str, session: T):
+        self.save(session_id, session)
+
+    async def adelete(self, session_id: str) -> bool:
+        return self.delete(session_id)
+
+    async def astats(self) -> Dict[str, Any]:
+        return self.stats()
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore[T]):
+    """进程内会话存储，按最近访问顺序淘汰"""
+
+    def __init__(self, model_cls: Type[T], ttl: float = 1800, max_entries: int = 10000):
+        super().__init__(model_cls, ttl, max_entries)
+        # session_id -> (最近访问时间, 会话, 序列化大小)
+        self._data: "OrderedDict[str, Tuple[float, T, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, session_id: str) -> Optional[T]:
+        item = self._data.get(session_id)
+        if item is None:
+            return None
+        accessed_at, session, size = item
+        if accessed_at + self.ttl < time.time():
+            self._remove(session_id)
+            self.evictions += 1
+            return None
+        self._data[session_id] = (time.time(), session, size)
+        self._data.move_to_end(session_id)
+        return session
+
+    def save(self, session_id: str, session: T):
+        size = len(serialize_session(session).encode("utf-8"))
+        self._remove(session_id)
+        self._data[session_id] = (time.time(), session, size)
+        self._bytes += size
+        self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> bool:
+        item = self._data.pop(session_id, None)
+        if item is None:
+            return False
+        self._bytes -= item[2]
+        return True
+
+    def _evict(self):
+        """淘汰过期会话以及超出容量的最久未访问会话"""
+        now = time.time()
+        while self._data:
+            session_id, (accessed_at, _, _) = next(iter(self._data.items()))
+            if accessed_at + self.ttl >= now and len(self._data) <= self.max_entries:
+                break
+            self._remove(session_id)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteSessionStore(SessionStore[T]):
+    """基于 SQLite 文件的会话存储，多个 uvicorn worker 可共享同一文件
+
+    读写使用各自的连接：等待其他 worker 释放写锁时，读取（包括指标采集中的 len）不受影响
+    """
+
+    # 每写入多少次执行一次过期清理和容量淘汰
+    EVICT_EVERY = 100
+    # 执行 SQLite 操作的线程数
+    WORKERS = 4
+
+    def __init__(self, model_cls: Type[T], path: str, ttl: float = 1800, max_entries: int = 10000):
+        super().__init__(model_cls, ttl, max_entries)
+        self.path = path
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._conn = self._connect()
+        self._read_conn = self._connect()
+        self._executor = ThreadPoolExecutor(self.WORKERS, thread_name_prefix="session-store")
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+            self._conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _run(self, func, *args):
+        """在线程池中执行阻塞的 SQLite 操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def aget(self, session_id: str) -> Optional[T]:
+        return await self._run(self.get, session_id)
+
+    async def asave(self, session_id: str, session: T):
+        await self._run(self.save, session_id, session)
+
+    async def adelete(self, session_id: str) -> bool:
+        return await self._run(self.delete, session_id)
+
+    async def astats(self) -> Dict[str, Any]:
+        return await self._run(self.stats)
+
+    def get(self, session_id: str) -> Optional[T]:
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if not row:
+            return None
+        data, updated_at = row
+        if updated_at + self.ttl < time.time():
+            self.delete(session_id)
+            self.evictions += 1
+            return None
+        return self.model_cls.model_validate_json(data)
+
+    def save(self, session_id: str, session: T):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, serialize_session(session), time.time())
+            )
+            self._conn.commit()
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def _evict(self):
+        """清理过期会话，并按最近写入时间淘汰超出容量的会话"""
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self._conn.commit()
+        self.evictions += expired + overflow
+
+    def __len__(self) -> int:
+        with self._read_lock:
+            return self._read_conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._read_lock:
+            count, size = self._read_conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(data AS BLOB))), 0) FROM sessions"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+
+
+def create_session_store(model_cls: Type[T], backend: str = "memory", path: str = "sessions.db",
+                         ttl: float = 1800, max_entries: int = 10000) -> SessionStore[T]:
+    """按后端名称创建会话存储"""
+    if backend == "sqlite":
+        return SQLiteSessionStore(model_cls, path, ttl, max_entries)
+    if backend == "memory":
+        return MemorySessionStore(model_cls, ttl, max_entries)
+    raise ValueError(f"未知的会话存储后端: {backend}")
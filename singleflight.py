@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+进行中调用合并（singleflight）
+同一时刻参数完全相同的 MCP 工具调用或LLM调用只向上游发出一次，其余调用方等待同一个结果：
+- 上游成功或失败时，结果或异常分发给所有等待者
+- 每个等待者按自己的时间预算等待，单个等待者取消或超时不影响其他等待者
+- 上游调用（含重试和对冲）以所有等待者中最晚的截止时间为预算，不会超出仍在等待的请求的预算
+- 所有等待者都放弃后才取消上游调用
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from deadline import Deadline, call_with_deadline, current_deadline, use_deadline
+from metrics import COALESCED_CALLS
+from tracing import set_attribute
+
+# 是否合并进行中的相同调用
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+
+
+class _Flight:
+    """一次共享的上游调用、其截止时间及等待者数量"""
+
+    __slots__ = ("task", "deadline", "waiters")
+
+    def __init__(self, task: asyncio.Future, deadline: Deadline):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并进行中的异步调用"""
+
+    def __init__(self, kind: str, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.kind = kind
+        self.enabled = enabled
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]], name: str = "") -> Any:
+        """key 相同的调用正在进行时等待其结果，否则调用 factory() 发起新的上游调用"""
+        if not self.enabled:
+            return await factory()
+
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            # 共享调用使用独立的截止时间对象，后加入的等待者可将其延长到自己的截止时间
+            deadline = Deadline(current_deadline())
+            with use_deadline(deadline):
+                flight = _Flight(asyncio.ensure_future(factory()), deadline)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            flight.deadline.extend(current_deadline())
+            self.coalesced += 1
+            COALESCED_CALLS.inc(self.kind, name)
+            set_attribute("coalesced", True)
+
+        flight.waiters += 1
+        try:
+            return await call_with_deadline(asyncio.shield(flight.task))
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 所有等待者都已放弃，取消上游调用；立即移除，之后的相同调用重新发起
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+class CoalescedTool:
+    """与 MCP 工具接口一致的包装，参数相同的进行中调用共享同一次上游请求"""
+
+    __slots__ = ("tool", "name", "flight")
+
+    def __init__(self, tool, flight: SingleFlight):
+        self.tool = tool
+        self.name = tool.name
+        self.flight = flight
+
+    async def ainvoke(self, arguments, **kwargs):
+        try:
+            key = (self.name, json.dumps(arguments, sort_keys=True, ensure_ascii=False))
+        except TypeError:
+            key = None
+        if key is None or kwargs:
+            return await self.tool.ainvoke(arguments, **kwargs)
+        return await self.flight.do(key, lambda: self.tool.ainvoke(arguments), self.name)
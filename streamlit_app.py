@@ -20,19 +20,40 @@ st.set_page_config(
 
 # API 配置
 API_BASE_URL = "http://localhost:8000"
+# 请求超时（秒）；同时通过 X-Request-Timeout 告知后端，超时后后端不再继续处理
+STREAM_TIMEOUT = 60
 
-def call_api(endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
-    """调用 API"""
-    try:
-        response = requests.post(f"{API_BASE_URL}{endpoint}", json=data, timeout=30)
+# 流式接口各阶段的进度提示
+STAGE_LABELS = {
+    "fast_parse": "⚡ 已解析出行需求",
+    "intent": "🧠 已识别意图",
+    "city": "🏙️ 已确认城市信息",
+    "format": "📍 已补全地址",
+    "geocode": "🗺️ 已获取起终点坐标",
+    "distance": "📏 已计算距离",
+    "route": "🚀 已完成路线规划",
+}
+
+def stream_api(endpoint: str, data: Dict[str, Any]):
+    """调用 SSE 流式 API，逐个返回 (事件名, 事件数据)
+
+    后端超出时间预算时返回 504，或直接结束已开始的流（没有 done/error 事件），均按超时处理
+    """
+    with requests.post(f"{API_BASE_URL}{endpoint}", json=data, stream=True, timeout=(5, STREAM_TIMEOUT),
+                       headers={"X-Request-Timeout": str(STREAM_TIMEOUT)}) as response:
+        if response.status_code == 504:
+            raise requests.exceptions.Timeout("后端处理超时")
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.ConnectionError:
-        return {"success": False, "message": "❌ 无法连接到API服务，请确保后端服务正在运行"}
-    except requests.exceptions.Timeout:
-        return {"success": False, "message": "❌ 请求超时，请稍后重试"}
-    except Exception as e:
-        return {"success": False, "message": f"❌ API调用失败: {str(e)}"}
+        event = "message"
+        finished = False
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                finished = finished or event in ("done", "error")
+                yield event, json.loads(line[len("data:"):].strip())
+        if not finished:
+            raise requests.exceptions.Timeout("后端处理超时，响应未完成")
 
 def format_markdown_result(text: str) -> str:
     """格式化结果为更好的markdown显示"""
@@ -60,24 +81,41 @@ def main():
             st.markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # 显示思考状态
+        # 显示思考状态，逐阶段展示进度并流式显示结果
         with st.chat_message("assistant"):
-            with st.spinner("🤔 正在规划路径..."):
-                # 调用 API
-                api_data = {
-                    "user_input": prompt,
-                    "session_id": st.session_state.session_id
-                }
-                
-                result = call_api("/route", api_data)
-                
-                if result.get("success"):
-                    response = format_markdown_result(result["message"])
-                else:
-                    response = result.get("message", "❌ 未知错误")
-                
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+            status = st.status("🤔 正在规划路径...")
+            placeholder = st.empty()
+            response = ""
+            
+            # 调用流式 API
+            api_data = {
+                "user_input": prompt,
+                "session_id": st.session_state.session_id
+            }
+            
+            try:
+                for event, payload in stream_api("/route/stream", api_data):
+                    if event == "stage":
+                        status.write(STAGE_LABELS.get(payload.get("stage"), payload.get("stage")))
+                    elif event == "chunk":
+                        response += payload.get("text", "")
+                        placeholder.markdown(format_markdown_result(response))
+                    elif event == "error":
+                        response = f"❌ API调用失败: {payload.get('detail', '未知错误')}"
+                status.update(label="✅ 规划完成", state="complete")
+            except requests.exceptions.ConnectionError:
+                response = "❌ 无法连接到API服务，请确保后端服务正在运行"
+                status.update(label="❌ 规划失败", state="error")
+            except requests.exceptions.Timeout:
+                response = "❌ 请求超时，请稍后重试"
+                status.update(label="❌ 规划失败", state="error")
+            except Exception as e:
+                response = f"❌ API调用失败: {str(e)}"
+                status.update(label="❌ 规划失败", state="error")
+            
+            response = format_markdown_result(response) or "❌ 未知错误"
+            placeholder.markdown(response)
+            st.session_state.messages.append({"role": "assistant", "content": response})
     
     # 简单的清除按钮（放在侧边栏）
     with st.sidebar:
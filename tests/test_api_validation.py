@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import route_agent_api
+
+
+@pytest.fixture(scope="module")
+def client():
+    # 不进入上下文，不触发 startup：只验证请求校验，无需连接MCP服务
+    return TestClient(route_agent_api.app)
+
+
+@pytest.mark.parametrize("pair", [
+    {"origin": "", "destination": "深圳市壹方城"},
+    {"origin": "深圳市深圳北站", "destination": "  "},
+    {"origin": "", "destination": "  "},
+])
+def test_batch_rejects_blank_endpoints(client, pair):
+    response = client.post("/route/batch", json={"pairs": [pair]})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("body", [
+    {"origins": [], "destinations": ["深圳市壹方城"]},
+    {"origins": ["  "], "destinations": ["深圳市壹方城"]},
+    {"origins": ["深圳市华强北"], "destinations": ["深圳市壹方城"], "type": "2"},
+])
+def test_distance_matrix_rejects_invalid_requests(client, body):
+    response = client.post("/distance/matrix", json=body)
+    assert response.status_code == 422
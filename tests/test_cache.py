@@ -0,0 +1,49 @@
+import time
+
+from cache import GeocodeCache, SQLiteStore
+
+
+def test_writes_are_flushed_on_close(tmp_path):
+    path = str(tmp_path / "cache.db")
+    store = SQLiteStore(path, "geocode")
+    store.set("深圳北站", "114.029,22.609", 60)
+    store.close()
+
+    store = SQLiteStore(path, "geocode")
+    assert store.get("深圳北站")[1] == "114.029,22.609"
+    store.close()
+
+
+def test_purge_removes_expired_and_caps_rows(tmp_path):
+    path = str(tmp_path / "cache.db")
+    store = SQLiteStore(path, "geocode", max_rows=3, purge_interval=0)
+    store.set("expired", None, -1)
+    for i in range(5):
+        store.set(f"addr{i}", i, 60 + i)
+    store.close()
+
+    store = SQLiteStore(path, "geocode", max_rows=3, purge_interval=0.05)
+    store.set("trigger", 99, 3600)
+    deadline = time.monotonic() + 5
+    while (store.count() != 3 or store.get("trigger") is None) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.count() == 3
+    # 最早过期的条目先被淘汰
+    assert [store.get(key) is None for key in ("expired", "addr0", "addr1", "addr2")] == [True] * 4
+    assert store.get("trigger")[1] == 99
+    assert store.purged == 4
+    store.close()
+
+
+def test_geocode_cache_reads_back_through_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = GeocodeCache(path)
+    cache.set("深圳北站", "114.029,22.609")
+    cache.set_negative("不存在的地址")
+    cache.close()
+
+    cache = GeocodeCache(path)
+    assert cache.get("深圳北站") == (True, "114.029,22.609")
+    assert cache.get("不存在的地址") == (True, None)
+    assert cache.disk_hits == 2
+    cache.close()
@@ -0,0 +1,21 @@
+import numpy as np
+
+from geo_distance import DistanceMatrix, estimate_distance, pairwise_distances
+
+
+def test_pairwise_matches_single_estimates():
+    origins = ["114.029,22.609", "114.085,22.547"]
+    destinations = ["113.883,22.556", "114.059,22.553", "114.029,22.609"]
+    matrix = pairwise_distances(origins, destinations)
+    assert matrix.shape == (2, 3)
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            assert round(matrix[i, j]) == estimate_distance(origin, destination)
+    assert matrix[0, 2] == 0
+
+
+def test_straight_line_matrix_has_no_durations():
+    result = DistanceMatrix.straight_line(["114.029,22.609"], ["113.883,22.556", "114.059,22.553"]).to_dict()
+    assert result["durations"] == [[None, None]]
+    assert result["nearest"][0]["destination_index"] == 1
+    assert np.all(np.array(result["distances"]) > 0)
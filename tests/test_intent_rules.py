@@ -0,0 +1,33 @@
+import pytest
+
+from intent_rules import IntentRuleParser
+
+
+@pytest.mark.parametrize("text, locations", [
+    ("从莲花山公园到华强北怎么走", ["莲花山公园", "华强北"]),
+    ("我想从深圳北站去华强北", ["深圳北站", "华强北"]),
+    ("请问从世界之窗前往欢乐谷的路线？", ["世界之窗", "欢乐谷"]),
+    ("莲花山公园到壹方城", ["莲花山公园", "壹方城"]),
+    ("深圳北站到华强北怎么走", ["深圳北站", "华强北"]),
+])
+def test_route_sentences(text, locations):
+    result = IntentRuleParser().parse(text)
+    assert result == {"intent_type": "route_request", "locations": locations}
+
+
+@pytest.mark.parametrize("text", [
+    "他们去哪了",
+    "打算去天安门",
+    "送我去机场",
+    "坐地铁去华强北",
+    "帮我查去天安门",
+    "明早去机场",
+    "送我到机场",
+    "坐地铁到华强北",
+    "明早到机场",
+    "他们到哪了",
+    "从这里到那里怎么走",
+    "不对，应该是从深圳北站到华强北",
+])
+def test_non_route_sentences_fall_back_to_llm(text):
+    assert IntentRuleParser().parse(text) is None
@@ -0,0 +1,28 @@
+import json
+
+from log_setup import JSONLWriter
+
+
+def test_jsonl_writer_rotates_by_size(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    writer = JSONLWriter(str(path), max_bytes=200, backup_count=2)
+    for i in range(30):
+        writer.write({"i": i, "pad": "x" * 20})
+    writer.close()
+
+    files = sorted(tmp_path.iterdir())
+    assert [f.name for f in files] == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(f.stat().st_size <= 200 for f in files)
+    # 最新的记录在当前文件，超出保留数量的旧文件被丢弃
+    last = [json.loads(line)["i"] for line in path.read_text(encoding="utf-8").splitlines()]
+    assert last[-1] == 29
+
+
+def test_jsonl_writer_without_limit_appends(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    writer = JSONLWriter(str(path))
+    for i in range(30):
+        writer.write({"i": i})
+    writer.close()
+    assert [f.name for f in tmp_path.iterdir()] == ["traffic.jsonl"]
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 30
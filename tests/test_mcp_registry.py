@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import ToolException
+
+from mcp_registry import ConnectionPool, ToolRegistry
+
+
+class FailingConnection:
+    def __init__(self, error):
+        self.error = error
+
+    async def invoke(self, tool_name, arguments):
+        raise self.error
+
+
+def invoke_with(error):
+    reported = []
+    pool = ConnectionPool([], on_failure=reported.append)
+    pool._pick = lambda tool_name: FailingConnection(error)
+    with pytest.raises(type(error)):
+        asyncio.run(pool.invoke("maps_geo", {}))
+    return reported
+
+
+def test_business_errors_are_not_reported_as_connection_failures():
+    assert invoke_with(ToolException("INVALID_PARAMS")) == []
+
+
+def test_connection_errors_are_reported():
+    assert len(invoke_with(ConnectionResetError("reset"))) == 1
+
+
+def test_report_failure_wakes_probe_at_most_once_per_interval():
+    async def scenario():
+        registry = ToolRegistry({"amap": {"url": "http://127.0.0.1", "transport": "sse"}}, min_probe_interval=60)
+        registry._wakeup = asyncio.Event()
+        registry.report_failure("first")
+        assert registry._wakeup.is_set()
+        registry._wakeup.clear()
+        registry.report_failure("second")
+        assert not registry._wakeup.is_set()
+        assert registry.last_error == "second"
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+from bench.replay import group_sessions
+
+
+def record(ts, path, session_id=None, body=None):
+    return {"ts": ts, "method": "POST", "path": path, "session_id": session_id, "body": body}
+
+
+def test_records_without_session_share_the_default_session_in_order():
+    records = [
+        record(1, "/route", body={"user_input": "从深圳北站到华强北"}),
+        record(2, "/route/stream", body={"user_input": "深圳", "session_id": None}),
+        record(3, "/route", "a", body={"user_input": "从莲花山到壹方城", "session_id": "a"}),
+        record(4, "/route/batch", body={"pairs": []}),
+        record(5, "/route/batch", body={"pairs": []}),
+    ]
+    groups = group_sessions(records, "replay")
+    assert [[r["ts"] for r in group] for group in groups] == [[1, 2], [3], [4], [5]]
+    # 默认会话改写为回放专用的会话ID，不影响目标服务上真实的 default 会话
+    default_ids = {r["body"]["session_id"] for r in groups[0]}
+    assert default_ids == {"replay-0"}
+    assert groups[1][0]["body"]["session_id"] == "replay-1"
+    assert "session_id" not in groups[2][0]["body"]
+
+
+def test_session_paths_are_rewritten():
+    groups = group_sessions([record(1, "/route", "a", {"session_id": "a"}), record(2, "/session/a", "a")], "r")
+    assert [r["path"] for r in groups[0]] == ["/route", "/session/r-0"]
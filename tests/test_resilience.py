@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import ToolException
+
+from resilience import CircuitBreaker, ResiliencePolicy, ToolGuard
+
+
+def make_guard(retries: int = 3, breaker_failures: int = 2) -> ToolGuard:
+    policy = ResiliencePolicy(retries=retries, retry_base_delay=0, hedge=False, breaker_failures=breaker_failures)
+    return ToolGuard("maps_geo", policy)
+
+
+class FakeTool:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def test_business_errors_are_not_retried_and_keep_breaker_closed():
+    guard = make_guard()
+    tool = FakeTool(ToolException("INVALID_PARAMS"))
+
+    async def run():
+        for _ in range(5):
+            with pytest.raises(ToolException):
+                await guard.call(tool)
+
+    asyncio.run(run())
+    assert tool.calls == 5
+    assert guard.retries == 0
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.breaker.failures == 0
+
+
+def test_valid_call_succeeds_after_bad_calls():
+    guard = make_guard()
+    bad = FakeTool(ToolException("ENGINE_RESPONSE_DATA_ERROR"))
+    good = FakeTool("ok")
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ToolException):
+                await guard.call(bad)
+        return await guard.call(good)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_transient_errors_are_retried_and_count_once_per_call():
+    guard = make_guard(breaker_failures=3)
+    tool = FakeTool(ConnectionResetError("reset"))
+
+    async def run():
+        with pytest.raises(ConnectionResetError):
+            await guard.call(tool)
+
+    asyncio.run(run())
+    assert tool.calls == 4
+    assert guard.retries == 3
+    assert guard.breaker.failures == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_transient_failures_open_breaker():
+    guard = make_guard(retries=0)
+    tool = FakeTool(ConnectionResetError("reset"))
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ConnectionResetError):
+                await guard.call(tool)
+
+    asyncio.run(run())
+    assert guard.breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,32 @@
+import gzip
+
+import msgpack
+import orjson
+
+import response_codec
+from response_codec import JSON_MEDIA_TYPE, encode_response, negotiate_media_type
+
+
+def test_negotiates_msgpack_when_preferred():
+    assert negotiate_media_type("application/msgpack") == "application/msgpack"
+    assert negotiate_media_type("application/json, application/msgpack;q=0.5") == JSON_MEDIA_TYPE
+    assert negotiate_media_type(None) == JSON_MEDIA_TYPE
+    assert negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+
+
+def test_msgpack_only_without_msgpack_is_not_acceptable(monkeypatch):
+    monkeypatch.setattr(response_codec, "msgpack", None)
+    assert negotiate_media_type("application/msgpack") is None
+    assert negotiate_media_type("application/msgpack, */*;q=0.1") == JSON_MEDIA_TYPE
+
+
+def test_encode_response_round_trips_and_compresses(monkeypatch):
+    monkeypatch.setattr(response_codec, "RESPONSE_GZIP_MIN_BYTES", 16)
+    payload = {"success": True, "message": "路线" * 20}
+    response = encode_response(payload, "application/msgpack", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert msgpack.unpackb(gzip.decompress(response.body)) == payload
+
+    response = encode_response(payload, JSON_MEDIA_TYPE, None)
+    assert "content-encoding" not in response.headers
+    assert orjson.loads(response.body) == payload
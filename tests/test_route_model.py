@@ -0,0 +1,58 @@
+from route_model import Route, duration_minutes
+
+
+TRANSIT = {
+    "distance": "5200",
+    "transits": [{
+        "duration": "1860",
+        "walking_distance": "420",
+        "segments": [
+            {"walking": {"distance": "0", "duration": "0", "steps": []},
+             "bus": {"buslines": [{"name": "地铁1号线(罗宝线)", "type": "地铁线路",
+                                   "departure_stop": {"name": "购物公园"}, "arrival_stop": {"name": "华强路"},
+                                   "via_num": "3", "distance": "4500", "duration": "540"}]}},
+            {"walking": {"distance": "420", "duration": "350", "steps": [{"instruction": "向北步行", "road": "华强北路"}]},
+             "bus": {"buslines": []}},
+        ],
+    }],
+}
+
+
+def test_duration_minutes_shows_at_least_one_minute():
+    assert duration_minutes(59) == 1
+    assert duration_minutes(540) == 9
+
+
+def test_duration_minutes_is_zero_when_missing():
+    assert duration_minutes(0) == 0
+    assert Route.parse_transit(TRANSIT).segments[0].walking.duration == 0
+
+
+def test_zero_durations_are_left_out_of_formatted_route():
+    import route_agent_api
+
+    plan = dict(TRANSIT["transits"][0])
+    plan["segments"] = [dict(plan["segments"][0])]
+    plan["segments"][0]["walking"] = {"distance": "80", "steps": []}
+    plan["segments"][0]["bus"] = {"buslines": [dict(plan["segments"][0]["bus"]["buslines"][0], duration="0")]}
+    route = Route.parse_transit({"distance": "4500", "transits": [plan]})
+    text = route_agent_api.SimpleRouteAgent.format_route_result(None, route, "购物公园", "华强路", 4300)
+    assert "   距离: 80米\n" in text
+    assert "   时间:" not in text
+    assert "约0分钟" not in text and "约1分钟" not in text
+
+
+def test_parse_transit_keeps_preferred_plan():
+    route = Route.parse_transit(TRANSIT)
+    assert (route.type, route.distance, route.duration, route.walking_distance) == ("transit", 5200, 31, 420)
+    assert route.lines == ["地铁1号线(罗宝线)"]
+    assert route.segments[0].bus.is_subway and route.segments[1].bus is None
+    assert route.segments[1].walking.steps[0].road == "华强北路"
+    assert route.summary() == {"type": "transit", "distance": 5200, "duration": 31,
+                               "walking_distance": 420, "lines": ["地铁1号线(罗宝线)"], "transfers": 0}
+    assert route.raw_data is None
+
+
+def test_parse_without_plans_returns_none():
+    assert Route.parse_transit({"transits": []}) is None
+    assert Route.parse_walking({"route": {"paths": []}}) is None
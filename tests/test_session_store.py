@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from pydantic import BaseModel
+
+from session_store import SessionStore, SQLiteSessionStore
+
+
+class Session(BaseModel):
+    stage: str = "start"
+    turns: int = 0
+
+
+def test_concurrent_saves_from_two_connections(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = SQLiteSessionStore(Session, path)
+    second = SQLiteSessionStore(Session, path)
+
+    async def run():
+        await asyncio.gather(*(
+            store.asave(f"s{i}", Session(stage="waiting_city", turns=i))
+            for i in range(50) for store in (first, second)
+        ))
+        return await first.aget("s49"), await second.aget("s0")
+
+    latest, earliest = asyncio.run(run())
+    assert latest == Session(stage="waiting_city", turns=49)
+    assert earliest == Session(stage="waiting_city", turns=0)
+    assert len(first) == len(second) == 50
+    first.close()
+    second.close()
+
+
+def test_waiting_for_write_lock_does_not_block_event_loop(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(Session, path)
+    store.save("s", Session())
+    # 模拟另一个 worker 持有写锁
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def run():
+        ticks = 0
+        save = asyncio.ensure_future(store.asave("s", Session(turns=1)))
+        start = time.monotonic()
+        while time.monotonic() - start < 0.3:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not save.done()
+        # 读取不等待写锁
+        assert await store.aget("s") == Session()
+        assert len(store) == 1
+        other.execute("COMMIT")
+        await save
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+    assert store.get("s") == Session(turns=1)
+    other.close()
+    store.close()
+
+
+def test_incomplete_store_cannot_be_instantiated():
+    class GetOnlyStore(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore(Session)
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from deadline import DeadlineExceeded, DeadlineTool, deadline_scope, remaining
+from resilience import ResiliencePolicy, ToolGuard
+from singleflight import SingleFlight
+
+
+class FlakyTool:
+    """立即以连接错误失败的工具"""
+    name = "maps_geo"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, arguments):
+        self.calls += 1
+        raise ConnectionResetError("reset")
+
+
+def test_coalesced_call_keeps_request_deadline_and_skips_retry():
+    guard = ToolGuard("maps_geo", ResiliencePolicy(retries=3, hedge=False))
+    # 退避时间超过剩余预算，不应重试
+    guard.backoff = lambda attempt: 0.5
+    tool = DeadlineTool(FlakyTool())
+    flight = SingleFlight("mcp")
+
+    async def run():
+        with deadline_scope(0.1):
+            await flight.do("key", lambda: guard.call(lambda: tool.ainvoke({})))
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(run())
+    assert tool.tool.calls == 1
+    assert guard.retries == 0
+
+
+def test_shared_call_sees_the_latest_waiter_deadline():
+    flight = SingleFlight("mcp")
+    seen = []
+
+    async def slow():
+        await asyncio.sleep(0.15)
+        seen.append(remaining())
+        return "ok"
+
+    async def waiter(budget, delay):
+        await asyncio.sleep(delay)
+        with deadline_scope(budget):
+            return await flight.do("key", slow)
+
+    async def run():
+        return await asyncio.gather(waiter(0.1, 0), waiter(1.0, 0.01), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, DeadlineExceeded)
+    assert second == "ok"
+    # 共享调用的预算被延长到第二个等待者的截止时间，而不是没有预算
+    assert seen and 0.5 < seen[0] < 1.0
+
+
+def test_shared_call_without_waiter_deadline_is_unbounded():
+    flight = SingleFlight("mcp")
+
+    async def run():
+        return await flight.do("key", lambda: asyncio.sleep(0, result=remaining()))
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+请求链路追踪
+基于 contextvars 在同一请求的各步骤、MCP工具调用和LLM调用之间传递当前 span，
+结束的 span 交给可替换的导出器；默认导出器在后台线程追加写入本地 JSONL 文件，离线可用
+"""
+
+import atexit
+import functools
+import logging
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from log_setup import JSONLWriter
+
+# 导出器：jsonl（本地文件）或 none（不导出，仍生成 trace ID 供日志和响应头关联）
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+# 追踪文件路径，可包含 {pid} 占位符
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# 追踪文件按大小轮转：单个文件上限（字节，0 表示不轮转）和保留的旧文件数，默认与日志文件相同
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+# 请求采样比例（0~1），未采样的请求不记录 span
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+TRACE_HEADER = "X-Trace-Id"
+
+_TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """一次操作的耗时和属性"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start", "end", "error", "sampled")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.sampled = sampled
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def increment(self, key: str, amount: int = 1):
+        """累加计数类属性，如重试次数"""
+        if self.sampled:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class SpanExporter(ABC):
+    """导出器接口"""
+
+    @abstractmethod
+    def export(self, span: Span):
+        ...
+
+    def close(self):
+        pass
+
+
+class NullExporter(SpanExporter):
+    def export(self, span: Span):
+        pass
+
+
+class JSONLFileExporter(SpanExporter):
+    """在后台线程把 span 逐行追加到 JSONL 文件，调用方只负责入队；文件超过上限时轮转"""
+
+    def __init__(self, path: str, max_bytes: int = 0, backup_count: int = 0):
+        self._writer = JSONLWriter(path, name="trace-exporter", max_bytes=max_bytes, backup_count=backup_count)
+        self.path = self._writer.path
+
+    def export(self, span: Span):
+        self._writer.write(span.to_dict())
+
+    def close(self):
+        self._writer.close()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+
+
+def _create_exporter() -> SpanExporter:
+    if TRACE_EXPORTER == "jsonl":
+        return JSONLFileExporter(TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT)
+    if TRACE_EXPORTER == "none":
+        return NullExporter()
+    raise ValueError(f"未知的追踪导出器: {TRACE_EXPORTER}")
+
+
+def get_exporter() -> SpanExporter:
+    """首次使用时按配置创建导出器"""
+    global _exporter
+    if _exporter is None:
+        _exporter = _create_exporter()
+        atexit.register(_exporter.close)
+    return _exporter
+
+
+def set_exporter(exporter: SpanExporter):
+    """替换导出器（如接入其他追踪后端）"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = exporter
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def set_attribute(key: str, value: Any):
+    """给当前 span 设置属性，不在追踪中时忽略"""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+@contextmanager
+def start_span(name: str, trace_id: Optional[str] = None, **attributes):
+    """开始一个 span；存在当前 span 时作为其子 span，否则开始新的 trace"""
+    parent = _current_span.get()
+    if parent is not None:
+        span = Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes if parent.sampled else None)
+    else:
+        span = Span(name, trace_id or _new_id(128), None, random.random() < TRACE_SAMPLE_RATE, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end = time.time()
+        _current_span.reset(token)
+        if span.sampled:
+            get_exporter().export(span)
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """为异步函数创建 span 的装饰器"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(span_name, **attributes):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedTool:
+    """为每次 MCP 工具调用创建 span 的包装"""
+
+    __slots__ = ("tool", "name")
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+
+    async def ainvoke(self, arguments, **kwargs):
+        with start_span("mcp.ainvoke", tool=self.name):
+            return await self.tool.ainvoke(arguments, **kwargs)
+
+
+class TraceIdFilter(logging.Filter):
+    """给日志记录附加当前 trace ID，便于按请求检索日志"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = current_trace_id()
+        if trace_id:
+            record.trace_id = trace_id
+        return True
+
+
+class TracingMiddleware:
+    """ASGI 中间件：每个 HTTP 请求一个根 span，并在响应头中返回 trace ID
+
+    请求头带有合法的 X-Trace-Id 时沿用该 ID，便于与调用方的日志关联
+    """
+
+    def __init__(self, app, exclude_paths=("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-trace-id":
+                incoming = value.decode("latin-1").strip().lower()
+                break
+        if incoming and not _TRACE_ID_PATTERN.match(incoming):
+            incoming = None
+
+        with start_span("http", trace_id=incoming, method=scope["method"]) as span:
+            header = (TRACE_HEADER.lower().encode(), span.trace_id.encode())
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [header]
+                    span.set_attribute("status", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                span.name = f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"